@@ -0,0 +1,225 @@
+"""End-to-end crawl benchmark
+Serves a synthetic Macy's catalog from a local aiohttp stand-in server
+(sitemap index -> categories -> products, with configurable page size, latency and error rate)
+and runs each scraper against it in its own process, pointed there with MACYS_BASE_URL
+
+reports pages/sec, p50/p99 time to first byte, peak RSS and CPU utilisation per scraper
+(the runner keeps every latency sample, so quantiles are exact rather than histogram buckets),
+and writes them with the run's settings to bench_results/<timestamp>.json
+so runs can be compared over time
+
+a scraper that fails, or stores other than categories * products products, is flagged
+INCOMPLETE and makes the benchmark exit non-zero
+
+usage: python bench_crawl.py [--categories N] [--products M] [--page-kb KB]
+                             [--latency SECONDS] [--error-rate RATE] [--scrapers macys stream ...]
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import pathlib
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from aiohttp import web
+
+HERE = pathlib.Path(__file__).resolve().parent
+
+# each scraper runs in a child process through this snippet;
+# it writes its metrics summary to the path given as argv[1]
+SCRAPERS = {
+    'macys': 'import macys; macys.main(cache_dir=None, metrics=metrics)',
+    'phased': 'import macys_asyncio; macys_asyncio.main(macys_asyncio.INDEX_URL, stream=False, cache_dir=None, metrics=metrics, use_proxies=False)',
+    'stream': 'import macys_asyncio; macys_asyncio.main(macys_asyncio.INDEX_URL, stream=True, cache_dir=None, metrics=metrics, use_proxies=False)',
+}
+
+RUNNER = '''
+import json, sys
+from metrics import Metrics
+metrics = Metrics(samples=True)
+try:
+    {call}
+finally:
+    with open(sys.argv[1], 'w') as f:
+        json.dump(metrics.summary(), f)
+'''
+
+def filler(kb: int) -> str:
+    """markup padding a page out to roughly kb kilobytes"""
+    block = '<div class="productThumbnail"><span class="price">$19.99</span><img src="/img/x.jpg"/></div>\n'
+    return block * (kb * 1024 // len(block))
+
+class Catalog:
+    """synthetic catalog of categories products each;
+    every tenth product is also linked under a second slug to exercise canonicalization
+    """
+
+    def __init__(self, categories: int, products: int, page_kb: int, latency: float, error_rate: float):
+        self.categories = categories
+        self.products = products
+        self.padding = filler(page_kb)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(0)
+
+    async def delay(self) -> None:
+        if self.latency:
+            await asyncio.sleep(self.random.expovariate(1 / self.latency))
+        if self.random.random() < self.error_rate:
+            raise web.HTTPInternalServerError()
+
+    def page(self, body: str) -> web.Response:
+        return web.Response(text=f'<html><body>{body}{self.padding}</body></html>', content_type='text/html')
+
+    async def index(self, request: web.Request) -> web.Response:
+        await self.delay()
+        links = ['<a href="/shop/sitemap-index?id=199462">Index</a>']
+        links += [f'<a href="/shop/category-{c}?id={c}">Category {c}</a>' for c in range(self.categories)]
+        return self.page('\n'.join(links))
+
+    async def category(self, request: web.Request) -> web.Response:
+        await self.delay()
+        c = int(request.match_info['c'])
+        links = []
+        for j in range(self.products):
+            p = 10000000 + c * self.products + j
+            links.append(f'<a class="productDescLink" href="/shop/product/synthetic-{p}?ID={p}&amp;CategoryID={c}">{p}</a>')
+            if j % 10 == 0:
+                links.append(f'<a class="productDescLink" href="/shop/product/alt-{p}?ID={p}&amp;cm_sp=c{c}">{p}</a>')
+        return self.page('\n'.join(links))
+
+    async def product(self, request: web.Request) -> web.Response:
+        await self.delay()
+        p = request.query.get('ID', '0')
+        data = {
+            '@type': 'Product',
+            'productID': p,
+            'name': f'Synthetic Product {p}',
+            'category': 'Synthetic',
+            'image': f'https://slimages.macysassets.com/is/image/MCY/products/{p}.tif',
+            'url': str(request.url),
+            'brand': {'@type': 'Brand', 'name': f'Brand {int(p) % 50}'},
+            'description': 'A synthetic product served by bench_crawl.py.',
+            'offers': [{
+                '@type': 'Offer', 'priceCurrency': 'USD', 'price': f'{10 + int(p) % 90}.99', 'SKU': p,
+                'availability': 'http://schema.org/InStock', 'priceValidUntil': '2020-12-31',
+            }],
+        }
+        script = f'<script type="application/ld+json" id="productMktData">{json.dumps(data)}</script>'
+        return self.page(script)
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/shop/sitemap-index', self.index)
+        app.router.add_get('/shop/category-{c}', self.category)
+        app.router.add_get('/shop/product/{slug}', self.product)
+        return app
+
+def serve(catalog: Catalog) -> str:
+    """runs the stand-in server on a background thread, returning its base url"""
+    started = threading.Event()
+    address = {}
+
+    async def start() -> None:
+        runner = web.AppRunner(catalog.app())
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        address['port'] = site._server.sockets[0].getsockname()[1]
+        started.set()
+        await asyncio.Event().wait()
+
+    threading.Thread(target=asyncio.run, args=(start(),), daemon=True).start()
+    started.wait()
+    return f'http://127.0.0.1:{address["port"]}'
+
+def run(name: str, base_url: str, expected: int) -> dict:
+    """runs one scraper to completion in a fresh working directory"""
+    with tempfile.TemporaryDirectory() as tmp:
+        summary_path = os.path.join(tmp, 'metrics.json')
+        env = dict(os.environ, MACYS_BASE_URL=base_url, PYTHONPATH=str(HERE))
+        start = time.perf_counter()
+        with open(os.path.join(tmp, 'stderr.txt'), 'w+') as stderr:
+            child = subprocess.Popen(
+                [sys.executable, '-c', RUNNER.format(call=SCRAPERS[name]), summary_path],
+                cwd=tmp, env=env, stdout=subprocess.DEVNULL, stderr=stderr,
+            )
+            # wait4 rather than wait, for the child's peak RSS and CPU time
+            _, status, usage = os.wait4(child.pid, 0)
+            elapsed = time.perf_counter() - start
+            stderr.seek(0)
+            error = stderr.read().strip().splitlines()[-1:] if status else []
+        try:
+            with open(summary_path) as f:
+                summary = json.load(f)
+        except (OSError, ValueError):
+            summary = {'counters': {}, 'stages': {}}
+
+    requests = summary['counters'].get('requests', 0)
+    products = summary['counters'].get('products', 0)
+    ttfb = summary['stages'].get('ttfb', {})
+    cpu = usage.ru_utime + usage.ru_stime
+    return {
+        'scraper': name,
+        'exit_status': os.waitstatus_to_exitcode(status),
+        'error': error[0] if error else None,
+        'elapsed': elapsed,
+        'pages': requests,
+        'products': products,
+        'expected_products': expected,
+        'complete': status == 0 and products == expected,
+        'pages_per_sec': requests / elapsed,
+        'ttfb_p50': ttfb.get('p50'),
+        'ttfb_p99': ttfb.get('p99'),
+        'peak_rss_mb': usage.ru_maxrss / 1024,
+        'cpu_seconds': cpu,
+        'cpu_utilisation': cpu / elapsed,
+        'stages': summary['stages'],
+    }
+
+def ms(seconds: float) -> str:
+    return 'n/a' if seconds is None else f'{1000 * seconds:.1f}ms'
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='benchmark the scrapers against a local synthetic catalog')
+    parser.add_argument('--categories', type=int, default=10)
+    parser.add_argument('--products', type=int, default=50, help='products per category')
+    parser.add_argument('--page-kb', type=int, default=200, help='approximate size of every page')
+    parser.add_argument('--latency', type=float, default=0.05, help='mean server latency in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with a 500')
+    parser.add_argument('--scrapers', nargs='+', choices=SCRAPERS, default=list(SCRAPERS))
+    parser.add_argument('--output', default=str(HERE / 'bench_results'), help='directory for the JSON results')
+    args = parser.parse_args()
+
+    catalog = Catalog(args.categories, args.products, args.page_kb, args.latency, args.error_rate)
+    base_url = serve(catalog)
+    results = []
+    for name in args.scrapers:
+        result = run(name, base_url, args.categories * args.products)
+        results.append(result)
+        print(
+            f'{name}: {result["pages_per_sec"]:.1f} pages/sec, {result["products"]} products, '
+            f'ttfb p50 {ms(result["ttfb_p50"])} p99 {ms(result["ttfb_p99"])}, '
+            f'peak RSS {result["peak_rss_mb"]:.0f} MB, CPU {100 * result["cpu_utilisation"]:.0f}%'
+            + (f', failed: {result["error"]}' if result['exit_status'] else '')
+            + ('' if result['complete'] else f', INCOMPLETE: expected {result["expected_products"]} products')
+        )
+
+    stamp = datetime.datetime.now(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    os.makedirs(args.output, exist_ok=True)
+    path = os.path.join(args.output, f'{stamp}.json')
+    with open(path, 'w') as f:
+        json.dump({'timestamp': stamp, 'settings': vars(args), 'results': results}, f, indent=2)
+    print(f'results written to {path}')
+    if not all(result['complete'] for result in results):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Fetch scheduler benchmark
+Serves pages from a local aiohttp stand-in for macys.com
+and fetches them two ways:
+
+before: one session with "Connection: close" and every url gathered at once
+after: make_session() with a global cap, per-host limit and keep-alive reuse
+
+reports requests/sec and how many connections (handshakes) each opened
+
+usage: python bench_fetch.py [n_urls] [latency_seconds]
+"""
+
+import asyncio
+import sys
+import time
+
+from aiohttp import ClientSession, web
+
+from macys_asyncio import count_connections, make_session, make_requests
+
+PAGE = '<html><body>' + '<p>product</p>' * 2000 + '</body></html>'
+
+async def page(request: web.Request) -> web.Response:
+    await asyncio.sleep(request.app['latency'])
+    return web.Response(text=PAGE, content_type='text/html')
+
+async def serve(latency: float) -> tuple:
+    """starts the stand-in server on a free localhost port"""
+    app = web.Application()
+    app['latency'] = latency
+    app.router.add_get('/shop/product/{n}', page)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f'http://127.0.0.1:{port}'
+
+async def before(urls: list) -> dict:
+    stats = {}
+    async with ClientSession(headers={"Connection": "close"}, trace_configs=[count_connections(stats)]) as session:
+        await make_requests(urls, proxies=[], session=session)
+    return stats
+
+async def after(urls: list) -> dict:
+    stats = {}
+    async with make_session(stats=stats) as session:
+        await make_requests(urls, proxies=[], session=session)
+    return stats
+
+async def bench(n: int, latency: float) -> None:
+    runner, base = await serve(latency)
+    urls = [f'{base}/shop/product/{i}' for i in range(n)]
+    try:
+        for name, run in (('before', before), ('after', after)):
+            start = time.perf_counter()
+            stats = await run(urls)
+            elapsed = time.perf_counter() - start
+            print(
+                f'{name}: {n / elapsed:.1f} requests/sec, '
+                f'{stats.get("created", 0)} handshakes, {stats.get("reused", 0)} reused connections'
+            )
+    finally:
+        await runner.cleanup()
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.01
+    asyncio.run(bench(n, latency))
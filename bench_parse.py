@@ -0,0 +1,99 @@
+"""Parsing benchmark
+Parses a corpus of saved Macy's pages at 1, 2, 4 and N worker processes,
+or with --backends compares every extractor backend page by page:
+outputs must match the BeautifulSoup golden output, and per-page time
+and peak memory are reported for each backend
+
+the corpus directory holds saved pages as
+    <corpus>/category/*.html
+    <corpus>/product/*.html
+
+corpus/ holds a small committed set, checked by test_parsing.py
+
+usage: python bench_parse.py <corpus> [repeat] [--backends]
+"""
+
+import os
+import pathlib
+import sys
+import time
+import tracemalloc
+
+from parsing import BACKENDS, parse_pages, parse_product_data, parse_product_links
+
+def load(corpus: pathlib.Path, kind: str, repeat: int) -> list:
+    """reads saved pages as raw bytes, repeated to make a bigger corpus"""
+    pages = [path.read_bytes() for path in sorted((corpus / kind).glob('*.html'))]
+    return pages * repeat
+
+def safe_product_data(html: bytes) -> dict:
+    """product parser that tolerates saved pages without productMktData"""
+    try:
+        return parse_product_data(html)
+    except (AttributeError, ValueError):
+        return None
+
+def bench(corpus: pathlib.Path, repeat: int) -> None:
+    counts = sorted({1, 2, 4, os.cpu_count()})
+    for kind, parse in (('category', parse_product_links), ('product', safe_product_data)):
+        pages = load(corpus, kind, repeat)
+        if not pages:
+            print(f'no {kind} pages in {corpus / kind}')
+            continue
+        megabytes = sum(map(len, pages)) / 1e6
+        for workers in counts:
+            start = time.perf_counter()
+            parse_pages(pages, parse, workers=workers)
+            elapsed = time.perf_counter() - start
+            print(
+                f'{kind}: {workers} workers parsed {len(pages)} pages ({megabytes:.1f} MB) '
+                f'in {elapsed:.2f}s, {len(pages) / elapsed:.1f} pages/sec'
+            )
+
+def measure(extract, html: bytes) -> tuple:
+    """runs one extractor, returning its result, seconds taken and peak bytes allocated"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = extract(html)
+    except (AttributeError, ValueError):
+        result = None
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+def compare_backends(corpus: pathlib.Path) -> bool:
+    """checks every backend against the BeautifulSoup output on each saved page
+    returns True when all outputs are identical
+    """
+    identical = True
+    for kind, column in (('category', 0), ('product', 1)):
+        pages = sorted((corpus / kind).glob('*.html'))
+        totals = {name: [0.0, 0] for name in BACKENDS}
+        for path in pages:
+            html = path.read_bytes()
+            golden = measure(BACKENDS['soup'][column], html)
+            for name, extractors in BACKENDS.items():
+                result, elapsed, peak = golden if name == 'soup' else measure(extractors[column], html)
+                totals[name][0] += elapsed
+                totals[name][1] = max(totals[name][1], peak)
+                if result != golden[0]:
+                    identical = False
+                    print(f'MISMATCH {name} on {path}')
+        for name, (elapsed, peak) in totals.items():
+            if pages:
+                print(
+                    f'{kind}: {name} took {1000 * elapsed / len(pages):.2f} ms/page, '
+                    f'peak {peak / 1e6:.1f} MB over {len(pages)} pages'
+                )
+    print('all backends identical' if identical else 'backends differ')
+    return identical
+
+if __name__ == '__main__':
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    corpus = pathlib.Path(args[0])
+    if '--backends' in sys.argv:
+        sys.exit(0 if compare_backends(corpus) else 1)
+    repeat = int(args[1]) if len(args) > 1 else 1
+    bench(corpus, repeat)
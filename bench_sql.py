@@ -0,0 +1,104 @@
+"""SQLite writer benchmark
+Writes synthetic product dicts with the original end-of-run push_to_sql
+and with the batched ProductSink, and reports rows/sec for each
+
+ProductSink(changes_only=True) is measured on a first load, where every row is new
+and costs a state lookup, a state upsert and a change row on top of the product upsert,
+and on an unchanged recrawl, where only the lookup is paid and nothing is written
+
+usage: python bench_sql.py [n_products] [batch_size]
+"""
+
+import contextlib
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+from product import parse_product
+from storage import ProductSink
+
+def synthetic_products(n: int) -> list:
+    return [
+        {
+            '@type': 'Product',
+            'productID': str(10000000 + i),
+            'name': f'Synthetic Product {i}',
+            'category': f'Category {i % 50}',
+            'image': f'https://slimages.macysassets.com/is/image/MCY/products/{i}.tif',
+            'url': f'https://www.macys.com/shop/product/synthetic-product-{i}?ID={10000000 + i}',
+            'brand': {'@type': 'Brand', 'name': f'Brand {i % 200}'},
+            'description': 'A synthetic product used for benchmarking. ' * 4,
+            'offers': [{
+                '@type': 'Offer',
+                'priceCurrency': 'USD',
+                'price': f'{10 + i % 90}.99',
+                'SKU': f'{i:012d}',
+                'availability': 'http://schema.org/InStock',
+                'priceValidUntil': '2020-12-31',
+            }],
+        }
+        for i in range(n)
+    ]
+
+def original_push_to_sql(products: list, path: str) -> None:
+    """push_to_sql as it was before ProductSink, writing to path"""
+    with sqlite3.connect(path) as conn:
+        c = conn.cursor()
+        c.execute(
+            """CREATE TABLE IF NOT EXISTS products (
+                product_id INT, name VARCHAR(255), category VARCHAR(255), image VARCHAR(500),
+                url VARCHAR(500), product_type VARCHAR(50), brand VARCHAR(255), description VARCHAR(500),
+                currency VARCHAR(5), price FLOAT, sku VARCHAR(15), availability VARCHAR(100),
+                price_valid_until VARCHAR(25)
+            );
+            """
+        )
+
+        rows = []
+        for product in products:
+            data = (int(product.get('productID')), product.get('name'), product.get('category'),
+                product.get('image'), product.get('url'), product.get('@type'),
+                product.get('brand').get('name'), product.get('description'),
+                product.get('offers')[0].get('priceCurrency'), float(product.get('offers')[0].get('price')),
+                product.get('offers')[0].get('SKU'), product.get('offers')[0].get('availability'),
+                product.get('offers')[0].get('priceValidUntil'))
+            placeholders = ', '.join(['?'] * len(data))
+            print(data)
+            rows.append(data)
+
+        c.executemany(f'INSERT INTO products VALUES ({placeholders});', rows)
+        print('Pushed data to SQL table')
+
+def sink_products(products: list, path: str, batch_size: int, changes_only: bool = False) -> None:
+    with ProductSink(path, batch_size=batch_size, changes_only=changes_only) as sink:
+        for product in products:
+            sink.add(parse_product(product))
+
+def bench(n: int, batch_size: int) -> None:
+    products = synthetic_products(n)
+    with tempfile.TemporaryDirectory() as tmp:
+        track = lambda path: sink_products(products, path, batch_size, changes_only=True)
+        # (name, untimed setup or None, timed run)
+        runs = (
+            ('push_to_sql', None, lambda path: original_push_to_sql(products, path)),
+            (f'ProductSink(batch_size={batch_size})', None, lambda path: sink_products(products, path, batch_size)),
+            ('ProductSink(changes_only) first load', None, track),
+            ('ProductSink(changes_only) unchanged recrawl', track, track),
+        )
+        for i, (name, setup, run) in enumerate(runs):
+            path = os.path.join(tmp, f'{i}.db')
+            if setup is not None:
+                setup(path)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                run(path)
+            elapsed = time.perf_counter() - start
+            print(f'{name}: {n / elapsed:,.0f} rows/sec ({elapsed:.2f}s for {n:,} products)')
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    bench(n, batch_size)
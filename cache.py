@@ -0,0 +1,218 @@
+"""On-disk HTTP response cache shared by both scrapers
+bodies are stored zlib-compressed under the sha256 of their content,
+and a small SQLite index maps each normalized url to its body and validators
+
+fresh entries (younger than ttl) are served without a request;
+stale entries are revalidated with If-None-Match / If-Modified-Since
+and a 304 counts as a hit; once the bodies outgrow max_bytes
+the least recently used entries are evicted
+
+the cache keeps a running byte total and writes last-use times in batches,
+so neither a get nor a put costs more than a handful of indexed statements;
+async callers go through run(), which keeps the file, zlib and SQLite work
+on one thread of the cache's own instead of the event loop
+"""
+
+import asyncio
+import hashlib
+import os
+import sqlite3
+import time
+import zlib
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+Entry = namedtuple('Entry', ['body', 'etag', 'last_modified', 'fresh'])
+
+INDEX = """CREATE TABLE IF NOT EXISTS responses (
+    url TEXT PRIMARY KEY,
+    digest CHAR(64),
+    size INT,
+    etag TEXT,
+    last_modified TEXT,
+    fetched_at FLOAT,
+    used_at FLOAT
+);
+"""
+
+VALIDATORS = ('if-none-match', 'if-modified-since')
+
+def normalize_url(url: str) -> str:
+    """lowercases scheme and host, sorts the query and drops the fragment"""
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or '/', query, ''))
+
+class ResponseCache:
+    """content-addressed response cache in directory
+
+    usage:
+        entry = cache.get(url)
+        if entry and entry.fresh: use entry.body
+        else send cache.request_headers(headers, entry), then
+        cache.refresh(url) on 304 or cache.put(url, body, etag, last_modified) on 200
+
+    from a coroutine, the same calls go through run(), e.g. await cache.run(cache.get, url)
+    """
+
+    def __init__(self, directory: str = '.macys_cache', ttl: float = 24 * 60 * 60,
+                 max_bytes: int = 2 * 1024 ** 3, touch_batch: int = 500):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.touch_batch = touch_batch
+        self.stats = Counter()
+        self.used = {}
+        self._executor = None
+        os.makedirs(directory, exist_ok=True)
+        # run() may use the connection from the cache's thread; calls are never concurrent
+        self.conn = sqlite3.connect(os.path.join(directory, 'index.db'), check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode = WAL;')
+        self.conn.execute(INDEX)
+        self.conn.execute('CREATE INDEX IF NOT EXISTS responses_used_at ON responses (used_at);')
+        self.conn.commit()
+        self.total, = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses;').fetchone()
+
+    async def run(self, func, *args):
+        """runs one cache call on the cache's own thread, off the event loop"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(1, thread_name_prefix='cache')
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def get(self, url: str) -> Entry:
+        """returns the cached entry for url, or None"""
+        key = normalize_url(url)
+        row = self.conn.execute(
+            'SELECT digest, size, etag, last_modified, fetched_at FROM responses WHERE url = ?;', (key,)
+        ).fetchone()
+        if row is None:
+            self.stats['misses'] += 1
+            return None
+        digest, size, etag, last_modified, fetched_at = row
+        try:
+            with open(self._path(digest), 'rb') as f:
+                body = zlib.decompress(f.read())
+        except (OSError, zlib.error):
+            self._forget(key, digest, size)
+            self.stats['misses'] += 1
+            return None
+        fresh = time.time() - fetched_at < self.ttl
+        if fresh:
+            self.stats['hits'] += 1
+            self.stats['bytes_saved'] += len(body)
+        else:
+            self.stats['stale'] += 1
+        self.used[key] = time.time()
+        if len(self.used) >= self.touch_batch:
+            self._touch()
+        return Entry(body, etag, last_modified, fresh)
+
+    def _touch(self) -> None:
+        """writes the waiting last-use times in one transaction"""
+        if self.used:
+            self.conn.executemany(
+                'UPDATE responses SET used_at = ? WHERE url = ?;', ((used, key) for key, used in self.used.items())
+            )
+            self.conn.commit()
+            self.used = {}
+
+    def request_headers(self, headers: dict, entry: Entry = None) -> dict:
+        """copies headers without any canned validators,
+        adding the cached entry's own so the origin can answer 304
+        """
+        headers = {k: v for k, v in headers.items() if k.lower() not in VALIDATORS}
+        if entry is not None:
+            if entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def refresh(self, url: str, entry: Entry) -> bytes:
+        """records a 304 for url and returns the cached body"""
+        now = time.time()
+        key = normalize_url(url)
+        self.conn.execute('UPDATE responses SET fetched_at = ?, used_at = ? WHERE url = ?;', (now, now, key))
+        self.conn.commit()
+        self.used.pop(key, None)
+        self.stats['revalidated'] += 1
+        self.stats['bytes_saved'] += len(entry.body)
+        return entry.body
+
+    def put(self, url: str, body: bytes, etag: str = None, last_modified: str = None) -> None:
+        """stores a 200 response body for url"""
+        digest = hashlib.sha256(body).hexdigest()
+        path = self._path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(f'{path}.tmp', 'wb') as f:
+                f.write(zlib.compress(body))
+            os.replace(f'{path}.tmp', path)
+        key = normalize_url(url)
+        now = time.time()
+        size = os.path.getsize(path)
+        old = self.conn.execute('SELECT digest, size FROM responses WHERE url = ?;', (key,)).fetchone()
+        self.conn.execute(
+            'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?);',
+            (key, digest, size, etag, last_modified, now, now),
+        )
+        self.conn.commit()
+        self.used.pop(key, None)
+        self.total += size
+        if old is not None:
+            self.total -= old[1]
+            if old[0] != digest:
+                self._remove_blob(old[0])
+        self.stats['bytes_fetched'] += len(body)
+        self.evict()
+
+    def evict(self) -> None:
+        """drops least recently used entries until bodies fit in max_bytes"""
+        if self.total <= self.max_bytes:
+            return
+        # last-use times must be current before choosing what to drop
+        self._touch()
+        for key, digest, size in self.conn.execute(
+            'SELECT url, digest, size FROM responses ORDER BY used_at;'
+        ).fetchall():
+            self._forget(key, digest, size)
+            self.stats['evicted'] += 1
+            if self.total <= self.max_bytes:
+                break
+
+    def _forget(self, key: str, digest: str, size: int) -> None:
+        self.conn.execute('DELETE FROM responses WHERE url = ?;', (key,))
+        self.conn.commit()
+        self.used.pop(key, None)
+        self.total -= size
+        self._remove_blob(digest)
+
+    def _remove_blob(self, digest: str) -> None:
+        """deletes a body once no url points at it"""
+        if self.conn.execute('SELECT 1 FROM responses WHERE digest = ?;', (digest,)).fetchone() is None:
+            try:
+                os.remove(self._path(digest))
+            except OSError:
+                pass
+
+    def report(self) -> str:
+        """one line of hit, miss and revalidation counters"""
+        return ', '.join(f'{name} {self.stats[name]}' for name in (
+            'hits', 'misses', 'stale', 'revalidated', 'evicted', 'bytes_fetched', 'bytes_saved'
+        ))
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+        self._touch()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
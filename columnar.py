@@ -0,0 +1,164 @@
+"""Columnar product export
+ParquetSink streams products into Parquet (or Arrow IPC) files partitioned as
+<directory>/crawl_date=YYYY-MM-DD/category=<category>/part-<n>.parquet,
+appending a row group each time a partition has row_group_size products waiting
+
+at most max_open files are open at once, the least recently written is closed first,
+and every partition is flushed once max_rows products are waiting in all;
+files are written under a dot-prefixed name and renamed when closed,
+so readers, which skip dot files, never see one a crash left without its footer
+
+brand, category and currency are dictionary-encoded, so price history over
+millions of rows is a scan of a few narrow columns instead of a full SQLite table read
+
+requires pyarrow
+"""
+
+import datetime
+import os
+import uuid
+from collections import OrderedDict
+from urllib.parse import quote
+
+from product import FIELDS, Product
+
+def _arrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError('columnar export requires pyarrow: pip install pyarrow') from e
+    return pyarrow
+
+def schema():
+    pa = _arrow()
+    dictionary = pa.dictionary(pa.int32(), pa.string())
+    types = {
+        'product_id': pa.int64(),
+        'price': pa.float64(),
+        'brand': dictionary,
+        'category': dictionary,
+        'currency': dictionary,
+    }
+    return pa.schema([(field, types.get(field, pa.string())) for field in FIELDS])
+
+class ParquetSink:
+    """streaming columnar writer, one open file per partition touched this crawl
+
+    format is 'parquet' or 'arrow' (Arrow IPC, one file per row group)
+    on_commit, when given, is called with the keys passed to add()
+    once their row group has been written
+
+    usage:
+        with ParquetSink('macys_parquet') as sink:
+            sink.add(product)
+    """
+
+    def __init__(self, directory: str = 'macys_parquet', crawl_date: datetime.date = None,
+                 row_group_size: int = 10000, format: str = 'parquet', on_commit=None,
+                 max_open: int = 32, max_rows: int = 100000):
+        if format not in ('parquet', 'arrow'):
+            raise ValueError(f'unknown columnar format {format!r}')
+        self.pa = _arrow()
+        self.schema = schema()
+        self.directory = directory
+        self.crawl_date = (crawl_date or datetime.date.today()).isoformat()
+        self.row_group_size = row_group_size
+        self.format = format
+        self.on_commit = on_commit
+        self.max_open = max_open
+        self.max_rows = max_rows
+        self.buffers = {}
+        self.keys = {}
+        self.writers = OrderedDict()
+        self.buffered = 0
+        self.written = 0
+
+    def add(self, product: Product, key=None) -> None:
+        """buffers one product under its category's partition"""
+        category = product.category or ''
+        buffer = self.buffers.setdefault(category, [])
+        buffer.append(product)
+        if key is not None:
+            self.keys.setdefault(category, []).append(key)
+        self.buffered += 1
+        if len(buffer) >= self.row_group_size:
+            self.flush(category)
+        elif self.buffered >= self.max_rows:
+            self.flush()
+
+    def _writer(self, category: str):
+        """the open writer for category's partition, opening a new part file if needed
+        and closing the least recently used one beyond max_open
+        """
+        if category in self.writers:
+            self.writers.move_to_end(category)
+            return self.writers[category][0]
+        while len(self.writers) >= self.max_open:
+            self._close(next(iter(self.writers)))
+        partition = os.path.join(
+            self.directory, f'crawl_date={self.crawl_date}', f'category={quote(category, safe="")}'
+        )
+        os.makedirs(partition, exist_ok=True)
+        name = f'part-{uuid.uuid4().hex}.{self.format}'
+        path = os.path.join(partition, f'.{name}')
+        if self.format == 'parquet':
+            writer = self.pa.parquet.ParquetWriter(
+                path, self.schema, compression='zstd', use_dictionary=['brand', 'category', 'currency']
+            )
+        else:
+            writer = self.pa.ipc.new_file(path, self.schema)
+        self.writers[category] = (writer, path, os.path.join(partition, name))
+        return writer
+
+    def _close(self, category: str) -> None:
+        writer, path, final = self.writers.pop(category)
+        writer.close()
+        os.replace(path, final)
+
+    def flush(self, category: str = None) -> None:
+        """writes the waiting products of one partition, or of every partition, as row groups"""
+        for category in [category] if category is not None else list(self.buffers):
+            products = self.buffers.pop(category, [])
+            if not products:
+                continue
+            self.buffered -= len(products)
+            columns = {field: [getattr(product, field) for product in products] for field in FIELDS}
+            table = self.pa.Table.from_pydict(columns, schema=self.schema)
+            self._writer(category).write_table(table)
+            if self.format == 'arrow':
+                # an IPC file holds one dictionary per field, so each batch gets a file of its own
+                self._close(category)
+            self.written += len(products)
+            keys = self.keys.pop(category, [])
+            if self.on_commit is not None:
+                self.on_commit(keys)
+
+    def close(self) -> None:
+        self.flush()
+        while self.writers:
+            self._close(next(iter(self.writers)))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def price_history(directory: str, product_id: int, format: str = 'parquet'):
+    """every crawl's price for product_id, as a pyarrow Table sorted by crawl_date
+    only the product_id, price and currency columns are read
+    format is the one the ParquetSink wrote with, 'parquet' or 'arrow'
+    """
+    pa = _arrow()
+    import pyarrow.dataset as ds
+
+    # category is already a column in every file, so only crawl_date is read from the paths
+    partitioning = ds.partitioning(pa.schema([('crawl_date', pa.string())]), flavor='hive')
+    dataset = ds.dataset(directory, format=format, partitioning=partitioning)
+    table = dataset.to_table(
+        columns=['crawl_date', 'product_id', 'price', 'currency'],
+        filter=ds.field('product_id') == product_id,
+    )
+    return table.sort_by('crawl_date')
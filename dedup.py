@@ -0,0 +1,64 @@
+"""Memory-compact url deduplication
+HashedSet keeps a 64-bit digest per url instead of the url string itself;
+BloomFilter keeps a fixed bit array sized up front, at the cost of
+occasionally treating a new url as already seen (about error_rate of the time)
+
+both expose add(url) -> True when url had not been seen
+"""
+
+import math
+from hashlib import blake2b
+
+def digest(url: str, size: int = 8) -> int:
+    """size-byte blake2b digest of url as an int"""
+    return int.from_bytes(blake2b(url.encode('utf-8'), digest_size=size).digest(), 'big')
+
+class HashedSet:
+    """set of url digests"""
+
+    def __init__(self):
+        self._digests = set()
+
+    def add(self, url: str) -> bool:
+        key = digest(url)
+        if key in self._digests:
+            return False
+        self._digests.add(key)
+        return True
+
+    def __contains__(self, url: str) -> bool:
+        return digest(url) in self._digests
+
+    def __len__(self) -> int:
+        return len(self._digests)
+
+class BloomFilter:
+    """bit array holding capacity urls with the given false positive rate"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+        self._array = bytearray((self.bits + 7) // 8)
+        self._count = 0
+
+    def _positions(self, url: str):
+        # double hashing: k positions from the two halves of one 128-bit digest
+        key = digest(url, 16)
+        first, second = key >> 64, key & (2 ** 64 - 1)
+        return ((first + i * second) % self.bits for i in range(self.hashes))
+
+    def add(self, url: str) -> bool:
+        new = False
+        for position in self._positions(url):
+            byte, bit = divmod(position, 8)
+            if not self._array[byte] & (1 << bit):
+                self._array[byte] |= 1 << bit
+                new = True
+        self._count += new
+        return new
+
+    def __contains__(self, url: str) -> bool:
+        return all(self._array[p // 8] & (1 << (p % 8)) for p in self._positions(url))
+
+    def __len__(self) -> int:
+        return self._count
@@ -0,0 +1,158 @@
+"""Durable crawl frontier
+Every category and product url is recorded in SQLite with its state,
+retry count and last fetch time, so an interrupted crawl resumes where it stopped
+and a later crawl can requeue only the urls that have gone stale
+
+states: pending -> in-flight -> done, or back to pending on failure
+until max_retries is reached and the url is marked failed
+"""
+
+import os
+import sqlite3
+import time
+from hashlib import blake2b
+
+PENDING = 'pending'
+IN_FLIGHT = 'in-flight'
+DONE = 'done'
+FAILED = 'failed'
+
+CREATE = """CREATE TABLE IF NOT EXISTS frontier (
+    url TEXT PRIMARY KEY,
+    kind VARCHAR(10),
+    state VARCHAR(10),
+    retries INT DEFAULT 0,
+    fetched_at FLOAT,
+    updated_at FLOAT
+);
+"""
+
+def parse_shard(text: str) -> tuple:
+    """reads a shard written i/N into (i, N), with 0 <= i < N"""
+    index, count = (int(part) for part in text.split('/'))
+    if not 0 <= index < count:
+        raise ValueError(f'shard {text} must be i/N with 0 <= i < N')
+    return index, count
+
+def in_shard(url: str, shard: tuple) -> bool:
+    """deterministically assigns url to one of N shards,
+    so several processes or machines can split the catalog without talking to each other
+    """
+    index, count = shard
+    return int.from_bytes(blake2b(url.encode('utf-8'), digest_size=8).digest(), 'big') % count == index
+
+def shard_path(path: str, shard: tuple) -> str:
+    """path with the shard written into the file name, e.g. macys_frontier.1-of-4.db,
+    so shards run side by side in one directory keep separate state
+    unsharded runs, and in-memory databases, keep path as it is
+    """
+    index, count = shard
+    if count == 1 or path == ':memory:':
+        return path
+    root, ext = os.path.splitext(path)
+    return f'{root}.{index}-of-{count}{ext}'
+
+class Frontier:
+    """SQLite-backed set of urls to crawl
+
+    path ':memory:' keeps the frontier for one run only
+    """
+
+    def __init__(self, path: str = 'macys_frontier.db', max_retries: int = 3):
+        self.max_retries = max_retries
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode = WAL;')
+        self.conn.execute('PRAGMA synchronous = NORMAL;')
+        self.conn.execute(CREATE)
+        self.conn.execute('CREATE INDEX IF NOT EXISTS frontier_kind_state ON frontier (kind, state);')
+        self.conn.commit()
+
+    def resume(self, recrawl_after: float = None) -> None:
+        """returns urls left in flight by an interrupted run to pending,
+        and with recrawl_after, also done urls fetched more than that many seconds ago
+        and failed urls last tried more than that many seconds ago, with their retries reset
+        """
+        now = time.time()
+        with self.conn:
+            self.conn.execute('UPDATE frontier SET state = ?, updated_at = ? WHERE state = ?;', (PENDING, now, IN_FLIGHT))
+            if recrawl_after is not None:
+                self.conn.execute(
+                    'UPDATE frontier SET state = ?, retries = 0, updated_at = ? WHERE state IN (?, ?) '
+                    'AND COALESCE(fetched_at, updated_at) < ?;',
+                    (PENDING, now, DONE, FAILED, now - recrawl_after),
+                )
+
+    def add(self, urls, kind: str) -> list:
+        """records urls as pending unless already known
+        returns the urls that were new
+        """
+        new = []
+        now = time.time()
+        with self.conn:
+            for url in urls:
+                cursor = self.conn.execute(
+                    'INSERT OR IGNORE INTO frontier (url, kind, state, updated_at) VALUES (?, ?, ?, ?);',
+                    (url, kind, PENDING, now),
+                )
+                if cursor.rowcount:
+                    new.append(url)
+        return new
+
+    def pending(self, kind: str, page: int = 1000):
+        """iterates over urls of kind that are pending now, reading page rows at a time
+        urls added while iterating are left for whoever added them
+        """
+        end, = self.conn.execute('SELECT COALESCE(MAX(rowid), 0) FROM frontier;').fetchone()
+        return self._pending(kind, page, end)
+
+    def _pending(self, kind: str, page: int, end: int):
+        last = 0
+        while True:
+            rows = self.conn.execute(
+                'SELECT rowid, url FROM frontier WHERE kind = ? AND state = ? AND rowid > ? AND rowid <= ? '
+                'ORDER BY rowid LIMIT ?;',
+                (kind, PENDING, last, end, page),
+            ).fetchall()
+            if not rows:
+                return
+            for last, url in rows:
+                yield url
+
+    def claim(self, url: str) -> None:
+        """marks url in flight"""
+        with self.conn:
+            self.conn.execute('UPDATE frontier SET state = ?, updated_at = ? WHERE url = ?;', (IN_FLIGHT, time.time(), url))
+
+    def finish(self, urls) -> None:
+        """marks urls done once their results are safely stored"""
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                'UPDATE frontier SET state = ?, fetched_at = ?, updated_at = ? WHERE url = ?;',
+                ((DONE, now, now, url) for url in urls),
+            )
+
+    def fail(self, url: str) -> None:
+        """counts a failed attempt, giving up on url after max_retries"""
+        with self.conn:
+            self.conn.execute(
+                'UPDATE frontier SET retries = retries + 1, updated_at = ?, '
+                'state = CASE WHEN retries + 1 >= ? THEN ? ELSE ? END WHERE url = ?;',
+                (time.time(), self.max_retries, FAILED, PENDING, url),
+            )
+
+    def counts(self) -> dict:
+        """number of urls in each (kind, state)"""
+        return {
+            (kind, state): n
+            for kind, state, n in self.conn.execute('SELECT kind, state, COUNT(*) FROM frontier GROUP BY kind, state;')
+        }
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,146 +1,274 @@
-"""Macy's web scraper
-Author: Ethan Brady
-last updated Jan 16 2020
-
-This script creates a database Macy's products by scraping their online website with BeautifulSoup and the requests module.
-Because the program makes http requests in a for-loop context, it's rather slow.
-
-Note: For speed reasons, the loop currently breaks at the first category;
-thus only the first category in the index is scraped for products.
-
-To speed up the script, next step is to implement multithreaded or asynchronous requests.
-"""
-
-import requests
-from bs4 import BeautifulSoup
-import re
-import json
-
-def call_soup(url, agent):
-    """visits url and returns soup"""
-    response = requests.get(url, headers=agent)
-    soup = BeautifulSoup(response.text, 'html.parser')
-    return soup
-
-def format_link(url):
-    """ensures returned url starts with https://www.macys.com"""
-    url = re.sub(r'^/shop/', 'https://www.macys.com/shop/', url)
-    url = re.sub(r'^//www.', 'https://www.', url)
-    if not re.search(r'^https://', url):
-        url = ''.join(['https://', url])
-    return url
-
-def get_category_href(url, agent):
-    """finds all category href from index page
-    returns set of formatted urls with index page removed
-    """
-    soup = call_soup(url, agent)
-    hrefs = {format_link(i.get('href')) for i in soup.find_all('a', href=re.compile('/shop'))}
-    hrefs.remove(url)
-    return hrefs
-
-def get_product_href(url, agent):
-    """finds all product href from category page
-    returns set of formatted urls
-    """
-    soup = call_soup(url, agent)
-    hrefs = {format_link(i.get('href')) for i in soup.find_all('a', {'class': 'productDescLink'}, href=re.compile('/shop'))}
-    return hrefs
-
-def get_product_data(url, agent):
-    """reads json from product page soup"""
-    soup = call_soup(url, agent)
-    product = json.loads(soup.find('script', {'id': 'productMktData'}).text)
-    # asset = json.loads(soup.find('script', {'type': 'text/javascript'}).text)
-    return product #, asset
-
-def push_to_sql(products):
-    """takes list of each product's data
-    pushes to SQL table
-    """
-    import sqlite3
-
-    with sqlite3.connect('macys_products.db') as conn:
-        c = conn.cursor()
-        c.execute(
-            """CREATE TABLE IF NOT EXISTS products (
-                product_id INT,
-                name VARCHAR(255),
-                category VARCHAR(255),
-                image VARCHAR(500),
-                url VARCHAR(500),
-                product_type VARCHAR(50),
-                brand VARCHAR(255),
-                description VARCHAR(500),
-                currency VARCHAR(5),
-                price FLOAT,
-                sku VARCHAR(15),
-                availability VARCHAR(100),
-                price_valid_until VARCHAR(25)
-            );
-            """
-        )
-
-        rows = []
-        for product in products:
-            name = product.get('name')
-            category = product.get('category')
-            product_id = int(product.get('productID'))
-            image = product.get('image')
-            url = product.get('url')
-            product_type = product.get('@type')
-            brand = product.get('brand').get('name')
-            description = product.get('description')
-            currency = product.get('offers')[0].get('priceCurrency')
-            price = float(product.get('offers')[0].get('price'))
-            sku = product.get('offers')[0].get('SKU')
-            availability = product.get('offers')[0].get('availability')
-            price_valid_until = product.get('offers')[0].get('priceValidUntil')
-
-            data = (product_id, name, category, image, url, product_type, brand, \
-                description, currency, price, sku, availability, price_valid_until)
-            placeholders = ', '.join(['?'] * len(data))
-            print(data)
-
-            rows.append(data)
-
-        c.executemany(f'INSERT INTO products VALUES ({placeholders});', rows)
-        print('Pushed data to SQL table')
-
-def main():
-    """begins function chain starting at Macy's index page
-    in this order:
-    1. index
-    2. categories
-    3. product links
-    4. product data
-    5. to SQL
-
-    Note: Currently the loop breaks at the first category;
-    thus only the first category in the index is scraped for products.
-    """
-    url = 'https://www.macys.com/shop/sitemap-index?id=199462'
-    agent = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_2) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/13.0.4 Safari/605.1.15'}
-    categories = get_category_href(url, agent)
-    print(f'{len(categories)} categories found')
-    
-    product_links = set()
-    for i, url in enumerate(categories):
-        product_links.update(get_product_href(url, agent))
-        print(f'clicked on category {i}...')
-        break
-
-    products = []
-    for i, url in enumerate(product_links):
-        products.append(get_product_data(url, agent))
-        print(f'clicked on product {i}...')
-
-    push_to_sql(products)
-
-if __name__ == '__main__':
-    import time
-
-    start = time.process_time()
-    main()
-    end = time.process_time()
+"""Macy's web scraper
+Author: Ethan Brady
+last updated Jan 16 2020
+
+This script creates a database Macy's products by scraping their online website with BeautifulSoup and the requests module.
+Because the program makes http requests in a for-loop context, it's rather slow.
+
+Every category in the index is scraped; pass --limit to stop after a few,
+or --shard i/N to split the categories between N processes or machines.
+
+usage: python macys.py [--shard i/N] [--limit N] [--bloom CAPACITY] [--workers N]
+                       [--frontier PATH] [--recrawl-after SECONDS] [--changes-only] [--parquet DIR]
+"""
+
+import requests
+from bs4 import BeautifulSoup
+import re
+import time
+from collections import deque
+from contextlib import nullcontext
+from itertools import islice
+
+from parsing import INDEX_URL, format_link, make_pool, parse_product_links, parse_product_page
+from storage import ProductSink
+from product import parse_product
+from columnar import ParquetSink
+from cache import ResponseCache
+from frontier import Frontier, in_shard, parse_shard, shard_path
+from dedup import BloomFilter, HashedSet
+from metrics import Metrics, timed_call
+from retry import RetriesExhausted, RetryPolicy
+
+def call_soup(url, agent, cache=None):
+    """visits url and returns soup"""
+    soup = BeautifulSoup(fetch(url, agent, cache), 'html.parser')
+    return soup
+
+def get(url, headers, metrics=None, policy=None):
+    """requests.get bounded by the policy's timeouts, retrying timeouts,
+    connection errors and 429/5xx responses with backoff until RetriesExhausted
+
+    records ttfb, body download time, status and bytes;
+    requests does not expose connect time on its own, so ttfb includes it
+    """
+    metrics = metrics or Metrics()
+    policy = policy or RetryPolicy()
+    attempt = 0
+    while True:
+        retry_after = None
+        policy.started()
+        try:
+            with metrics.request():
+                response = requests.get(
+                    url, headers=headers, stream=True, timeout=(policy.connect_timeout, policy.read_timeout)
+                )
+                metrics.observe('ttfb', response.elapsed.total_seconds())
+                with metrics.timer('body'):
+                    content = response.content
+            metrics.response(response.status_code, len(content))
+            failure = response.status_code if policy.retryable(response.status_code) else None
+            retry_after = response.headers.get('Retry-After')
+        except (requests.ConnectionError, requests.Timeout) as e:
+            failure = e
+
+        if failure is None:
+            return response
+        print(f'attempt {attempt} at {url} failed: {failure!r}')
+        metrics.count('errors')
+        if not policy.should_retry(attempt):
+            raise RetriesExhausted(f'{url} failed {attempt + 1} times, last with {failure!r}')
+        metrics.count('retries')
+        time.sleep(policy.backoff(attempt, retry_after))
+        attempt += 1
+
+def fetch(url, agent, cache=None, metrics=None, policy=None):
+    """visits url and returns raw page bytes for the parsing pool
+    with a cache, fresh pages are not requested and stale ones are revalidated
+    """
+    if cache is None:
+        return get(url, agent, metrics, policy).content
+
+    entry = cache.get(url)
+    if entry is not None and entry.fresh:
+        return entry.body
+    response = get(url, cache.request_headers(agent, entry), metrics, policy)
+    if response.status_code == 304 and entry is not None:
+        return cache.refresh(url, entry)
+    if response.status_code == 200:
+        cache.put(url, response.content, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+    return response.content
+
+def get_category_href(url, agent, cache=None):
+    """finds all category href from index page
+    returns set of formatted urls with index page removed
+    """
+    soup = call_soup(url, agent, cache)
+    hrefs = {format_link(i.get('href')) for i in soup.find_all('a', href=re.compile('/shop'))}
+    hrefs.remove(url)
+    return hrefs
+
+def get_product_href(url, agent, cache=None):
+    """finds all product href from category page
+    returns set of canonical urls, one per product
+    """
+    return set(dict(parse_product_links(fetch(url, agent, cache))).values())
+
+def get_product_data(url, agent, cache=None):
+    """reads Product from product page json"""
+    return parse_product_page(fetch(url, agent, cache))
+
+def push_to_sql(products):
+    """takes list of each product's json data
+    pushes to SQL table
+    """
+    with ProductSink() as sink:
+        for product in products:
+            sink.add(parse_product(product))
+    print('Pushed data to SQL table')
+
+def main(workers=None, batch_size=500, cache_dir='.macys_cache',
+         frontier_path='macys_frontier.db', products_path='macys_products.db', recrawl_after=None,
+         shard=(0, 1), limit=None, bloom=None, metrics=None, prometheus_path=None, url=INDEX_URL,
+         policy=None, parquet_dir=None, columnar_format='parquet', changes_only=False):
+    """begins function chain starting at Macy's index page
+    in this order:
+    1. index
+    2. categories
+    3. product links
+    4. product data
+    5. to SQL, committed every batch_size products as they are parsed
+
+    every category is visited unless limit caps how many;
+    shard (i, N) keeps only the categories that hash to shard i of N,
+    and with N > 1 the frontier and products database get per-shard file names,
+    so shards sharing a directory never pick up each other's pending urls
+
+    product urls are canonicalized and deduplicated on product ID before any request,
+    keeping a 64-bit digest per ID, or with bloom, a Bloom filter sized for that many IDs
+
+    pages are parsed in a pool of workers processes
+    while the next request is already being made
+    responses are cached in cache_dir between runs; pass None to disable
+
+    every url's progress is kept in the frontier at frontier_path,
+    so an interrupted run picks up where it stopped and skips completed work;
+    with recrawl_after (seconds), urls fetched longer ago than that are crawled again
+
+    wall-clock timings go to metrics: a progress line is printed as the crawl runs,
+    a JSON summary at the end, and with prometheus_path a Prometheus text dump
+
+    with changes_only, a product is only written to the products table when its price, availability,
+    price_valid_until or description differ from the last tracked crawl, and the change is logged
+
+    with parquet_dir, products are also written there as date/category-partitioned
+    Parquet (or Arrow IPC with columnar_format='arrow'); the frontier follows the SQLite commits
+
+    every request is bounded and retried by policy, a RetryPolicy shared across the crawl
+    so its retry budget spans every url
+    """
+    metrics = metrics or Metrics()
+    policy = policy or RetryPolicy()
+    agent = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_2) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/13.0.4 Safari/605.1.15'}
+    cache = ResponseCache(cache_dir) if cache_dir else None
+    categories = [url for url in get_category_href(url, agent, cache) if in_shard(url, shard)]
+    print(f'{len(categories)} categories found in shard {shard[0]}/{shard[1]}')
+
+    frontier = Frontier(shard_path(frontier_path, shard))
+    frontier.resume(recrawl_after)
+    frontier.add(categories, 'category')
+    seen = BloomFilter(bloom) if bloom else HashedSet()
+    columnar = ParquetSink(parquet_dir, format=columnar_format) if parquet_dir else None
+    duplicates = 0
+
+    def collect(url, future, handle):
+        """hands url's parsed result to handle, counting a failure if either raises"""
+        try:
+            result, seconds = future.result()
+            metrics.observe('parse', seconds)
+            handle(result, url)
+        except Exception as e:
+            print(f'failed on {url}: {e!r}')
+            frontier.fail(url)
+
+    def store(product, url):
+        sink.add(product, url)
+        if columnar is not None:
+            columnar.add(product)
+        metrics.count('products')
+
+    def record(links, url):
+        nonlocal duplicates
+        new = [link for key, link in links if seen.add(key)]
+        duplicates += len(links) - len(new)
+        frontier.add(new, 'product')
+        frontier.finish([url])
+
+    with make_pool(workers) as pool, ProductSink(
+        shard_path(products_path, shard), batch_size=batch_size, on_commit=frontier.finish, metrics=metrics, changes_only=changes_only
+    ) as sink, \
+            columnar or nullcontext():
+        pending = deque()
+        sharded = (url for url in frontier.pending('category') if in_shard(url, shard))
+        for i, url in enumerate(islice(sharded, limit)):
+            frontier.claim(url)
+            try:
+                pending.append((url, pool.submit(timed_call, parse_product_links, fetch(url, agent, cache, metrics, policy))))
+            except (requests.RequestException, RetriesExhausted) as e:
+                print(f'failed on {url}: {e!r}')
+                frontier.fail(url)
+            print(f'clicked on category {i}...')
+            metrics.report()
+            while pending and pending[0][1].done():
+                url, future = pending.popleft()
+                collect(url, future, record)
+
+        for url, future in pending:
+            collect(url, future, record)
+        print(f'{len(seen)} unique products found, {duplicates} duplicate product links skipped')
+
+        pending = deque()
+        for i, url in enumerate(frontier.pending('product')):
+            frontier.claim(url)
+            try:
+                pending.append((url, pool.submit(timed_call, parse_product_page, fetch(url, agent, cache, metrics, policy))))
+            except (requests.RequestException, RetriesExhausted) as e:
+                print(f'failed on {url}: {e!r}')
+                frontier.fail(url)
+            print(f'clicked on product {i}...')
+            metrics.report()
+            while pending and pending[0][1].done():
+                url, future = pending.popleft()
+                collect(url, future, store)
+
+        for url, future in pending:
+            collect(url, future, store)
+
+    print(f'Pushed {sink.written} products to SQL table')
+    if changes_only:
+        print(f'{sink.unchanged} unchanged products skipped')
+    if columnar is not None:
+        print(f'Wrote {columnar.written} products to {parquet_dir}')
+    print(f'Frontier: {frontier.counts()}')
+    frontier.close()
+    if cache is not None:
+        print(f'Response cache: {cache.report()}')
+        cache.close()
+    metrics.report(force=True)
+    print(metrics.to_json())
+    if prometheus_path:
+        with open(prometheus_path, 'w') as f:
+            f.write(metrics.prometheus())
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="scrape Macy's products into macys_products.db")
+    parser.add_argument('--shard', type=parse_shard, default=(0, 1), help='crawl only shard i of N categories, written i/N')
+    parser.add_argument('--limit', type=int, help='stop after this many categories')
+    parser.add_argument('--bloom', type=int, metavar='CAPACITY', help='dedup product urls with a Bloom filter sized for CAPACITY urls')
+    parser.add_argument('--workers', type=int, help='parsing processes, one per core by default')
+    parser.add_argument('--frontier', default='macys_frontier.db', help='frontier database tracking every url between runs')
+    parser.add_argument('--recrawl-after', type=float, metavar='SECONDS',
+                        help='crawl again urls fetched, or failed, more than SECONDS ago, e.g. 86400 for a daily recrawl')
+    parser.add_argument('--changes-only', action='store_true', help='write only products that changed since the last crawl')
+    parser.add_argument('--parquet', metavar='DIR', help='also write products to DIR as partitioned Parquet')
+    parser.add_argument('--prometheus', metavar='PATH', help='write a Prometheus text dump of the crawl metrics to PATH')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    main(workers=args.workers, frontier_path=args.frontier, recrawl_after=args.recrawl_after,
+         shard=args.shard, limit=args.limit, bloom=args.bloom, prometheus_path=args.prometheus,
+         parquet_dir=args.parquet, changes_only=args.changes_only)
+    end = time.perf_counter()
     print(f'Script executed in {end - start} seconds')
\ No newline at end of file
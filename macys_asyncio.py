@@ -2,34 +2,65 @@
 Last updated Jan 28 2019
 Author: Ethan Brady
 
-issue with SSL handshake in loop 2 in main()
+all requests share one pooled keep-alive session (see make_session)
+so product pages no longer open a socket and TLS handshake each
 """
 
+import os
 import requests
 import re
 import aiohttp
 import asyncio
-from aiohttp import ClientSession, ClientConnectorError, ClientHttpProxyError, ClientProxyConnectionError
+from aiohttp import ClientSession, ClientConnectorError, ClientHttpProxyError, ClientProxyConnectionError, TCPConnector, TraceConfig
+from aiohttp import ClientError, ClientTimeout
 from bs4 import BeautifulSoup
-import json
 import time
 import random
+from contextlib import ExitStack
 
-def call_soup(url: str) -> str:
-    """visits index page and returns soup"""
+from macys import get
+from parsing import INDEX_URL, format_link, make_pool, parse_pages, parse_product_links, parse_product_page
+from storage import ProductSink
+from columnar import ParquetSink
+from cache import ResponseCache
+from frontier import Frontier
+from dedup import HashedSet
+from metrics import Metrics, timed_call
+from retry import AdaptiveLimiter, RetriesExhausted, RetryPolicy
+
+def call_soup(url: str, cache: ResponseCache = None, metrics: Metrics = None, policy: RetryPolicy = None) -> str:
+    """visits index page and returns soup
+    with a cache, a fresh copy is used and a stale one is revalidated
+
+    the request is bounded and retried by policy like every other fetch (see macys.get);
+    an index that still fails, or answers other than 200, raises instead of yielding an empty crawl
+    """
     headers = pick_browser()
-    response = requests.get(url, headers=headers)
-    soup = BeautifulSoup(response.text, 'html.parser')
+    entry = cache.get(url) if cache is not None else None
+    if entry is not None and entry.fresh:
+        html = entry.body
+    else:
+        if cache is not None:
+            headers = cache.request_headers(headers, entry)
+        response = get(url, headers, metrics, policy)
+        if response.status_code != 200 and not (response.status_code == 304 and entry is not None):
+            raise requests.HTTPError(f'index {url} answered {response.status_code}', response=response)
+        html = response.content
+        if response.status_code == 304 and entry is not None:
+            html = cache.refresh(url, entry)
+        elif response.status_code == 200 and cache is not None:
+            cache.put(url, html, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+    soup = BeautifulSoup(html, 'html.parser')
     print(f'found soup from {url}')
     return soup
 
-def get_category_href(url: str) -> set:
+def get_category_href(url: str, cache: ResponseCache = None, metrics: Metrics = None) -> set:
     """finds all category href from index page
     returns set of formatted urls
     ensures index page does not reappear and create infinite loop
     """
     agent = pick_browser()
-    soup = call_soup(url)
+    soup = call_soup(url, cache, metrics)
     hrefs = {
         format_link(i.get('href'))
         for i in soup.find_all('a', href=re.compile('/shop'))
@@ -41,35 +72,30 @@ def get_category_href(url: str) -> set:
     print(f'{time.process_time()}: gathered {len(hrefs)} category links')
     return hrefs
 
-def format_link(url: str) -> str:
-    """ensures returned url starts with https://www.macys.com"""
-    url = re.sub(r'^/shop/', 'https://www.macys.com/shop/', url)
-    url = re.sub(r'^//www.', 'https://www.', url)
-    if not re.search(r'^https://', url):
-        url = ''.join(['https://', url])
-    return url
-
-def soup_products(categories: set) -> set:
-    """takes category html, turns to BeautifulSoup,
-    then returns product links
+def soup_products(categories: list, workers: int = None) -> set:
+    """takes category html, parses it across a process pool,
+    then returns one canonical link per product
     """
-    product_links = set()
-    for html in categories:
-        for i in BeautifulSoup(html, 'html.parser').find_all('a', {'class': 'productDescLink'}, href=re.compile('/shop')):
-            pl = format_link(i.get('href'))
-            product_links.add(pl)
-    print(f'{time.process_time()}: gathered {len(product_links)} product links')
-    return product_links
-
-def soup_product_data(product_links: set) -> set:
-    """visits each product link and finds
-    formatted json of product data
+    product_links = {}
+    found = 0
+    for links in parse_pages(categories, parse_product_links, workers=workers):
+        product_links.update(links)
+        found += len(links)
+    print(f'{time.process_time()}: gathered {len(product_links)} product links, '
+          f'skipped {found - len(product_links)} duplicates')
+    return set(product_links.values())
+
+def soup_product_data(product_pages: list, workers: int = None) -> set:
+    """parses each product page across a process pool
+    into a set of Products, skipping pages without product data
     """
     products = set()
-    for html in product_links:
-        for soup in BeautifulSoup(html, 'html.parser'):
-            p = json.loads(soup.find('script', {'id': 'productMktData'}).text)
-            products.add(p)
+    with make_pool(workers) as pool:
+        for future in [pool.submit(parse_product_page, html) for html in product_pages]:
+            try:
+                products.add(future.result())
+            except (AttributeError, KeyError, TypeError, ValueError) as e:
+                print(f'no product data: {e!r}')
     print(f'{time.process_time()}: gathered {len(products)} products')
     return products
 
@@ -140,6 +166,9 @@ def call_proxies() -> list:
     return proxies
 
 def pick_proxy(proxies: list) -> tuple:
+    """picks a random proxy, or none when the list is empty"""
+    if not proxies:
+        return None, None, None
     ip, port = random.choice(proxies)
     proxy = f'http://{ip}:{port}'
     return proxy, ip, port
@@ -153,67 +182,433 @@ def dodge_detection(proxies: list):
     delay = random.uniform(0.001, 0.5)
     return headers, proxy, delay, ip, port
 
-async def fetch_html(url: str, session: ClientSession, proxies: list, **kwargs) -> str:
-    """GET request wrapper to fetch page html and convert to soup
+async def fetch_html(url: str, session: ClientSession, proxies: list, cache: ResponseCache = None,
+                     metrics: Metrics = None, policy: RetryPolicy = None, limiter: AdaptiveLimiter = None,
+                     **kwargs) -> bytes:
+    """GET request wrapper to fetch raw page html
     headers and proxy are randomly chosen to dodge detection as robot
+    with a cache, fresh pages are not requested and stale ones are revalidated
+    body download time, status and bytes go to metrics
+
+    every attempt is bounded by the policy's connect/read timeouts;
+    timeouts, connection errors and 429/5xx responses are retried with backoff
+    until the policy gives up and RetriesExhausted is raised
+    with a limiter, requests in flight are held under its adaptive limit
+    cache reads and writes run on the cache's own thread, off the event loop
     """
+    entry = await cache.run(cache.get, url) if cache is not None else None
+    if entry is not None and entry.fresh:
+        return entry.body
+
+    metrics = metrics or Metrics()
+    policy = policy or RetryPolicy()
+    limiter = limiter or AdaptiveLimiter()
+    timeout = ClientTimeout(sock_connect=policy.connect_timeout, sock_read=policy.read_timeout)
+    attempt = 0
     while True:
-        try:
-            headers, proxy, delay, ip, port = dodge_detection(proxies)
-            response = await session.request(method='GET', url=url, headers=headers, proxy=proxy, **kwargs)
-        except (ClientHttpProxyError, ClientProxyConnectionError) as e:
-            proxies.remove((ip, port))
-        else:
+        headers, proxy, delay, ip, port = dodge_detection(proxies)
+        if cache is not None:
+            headers = cache.request_headers(headers, entry)
+        retry_after = None
+        policy.started()
+        # the pause happens before taking a slot, so it is neither held in flight nor timed
+        await asyncio.sleep(delay)
+        async with limiter:
+            with metrics.request():
+                start = time.perf_counter()
+                try:
+                    async with session.request(method='GET', url=url, headers=headers, proxy=proxy,
+                                               timeout=timeout, **kwargs) as response:
+                        with metrics.timer('body'):
+                            html = await response.read()
+                    metrics.response(response.status, len(html))
+                    failure = response.status if policy.retryable(response.status) else None
+                    retry_after = response.headers.get('Retry-After')
+                except (ClientHttpProxyError, ClientProxyConnectionError) as e:
+                    if (ip, port) in proxies:
+                        proxies.remove((ip, port))
+                    failure = e
+                except (ClientError, asyncio.TimeoutError) as e:
+                    failure = e
+                limiter.record(failure is None, time.perf_counter() - start)
+
+        if failure is None:
             break
+        print(f'attempt {attempt} at {url} failed: {failure!r}')
+        metrics.count('errors')
+        if not policy.should_retry(attempt):
+            raise RetriesExhausted(f'{url} failed {attempt + 1} times, last with {failure!r}')
+        metrics.count('retries')
+        await asyncio.sleep(policy.backoff(attempt, retry_after))
+        attempt += 1
 
     print(f'{round(time.process_time(),3)}: with status {response.status}, clicked on link {url}')
-    await asyncio.sleep(delay)
-    html = await response.text()
+    if response.status == 304 and entry is not None:
+        return await cache.run(cache.refresh, url, entry)
+    if response.status == 200 and cache is not None:
+        await cache.run(cache.put, url, html, response.headers.get('ETag'), response.headers.get('Last-Modified'))
     return html
-    
-async def make_requests(urls: set, proxies: list, **kwargs) -> set:
-    """asynchronously make http requests"""
-    async with ClientSession(headers={"Connection": "close"}) as session:
-        tasks = {
-            fetch_html(url, session=session, proxies=proxies, **kwargs)
-            for url in urls
-        }
-        results = await asyncio.gather(*tasks)
-        return results
 
-def main(url: str) -> None:
+def count_connections(stats: dict) -> TraceConfig:
+    """trace hooks counting new connections (each one a TCP+TLS handshake)
+    against pooled connections reused from keep-alive
+    """
+    async def on_create(session, context, params):
+        stats['created'] = stats.get('created', 0) + 1
+
+    async def on_reuse(session, context, params):
+        stats['reused'] = stats.get('reused', 0) + 1
+
+    trace = TraceConfig()
+    trace.on_connection_create_end.append(on_create)
+    trace.on_connection_reuseconn.append(on_reuse)
+    return trace
+
+def trace_latency(metrics: Metrics) -> TraceConfig:
+    """trace hooks timing each new connection (DNS + TCP/TLS) as the connect stage
+    and request start to response headers as the ttfb stage
+    """
+    async def on_request_start(session, context, params):
+        context.started = time.perf_counter()
+
+    async def on_connect_start(session, context, params):
+        context.connecting = time.perf_counter()
+
+    async def on_connect_end(session, context, params):
+        metrics.observe('connect', time.perf_counter() - context.connecting)
+
+    async def on_request_end(session, context, params):
+        metrics.observe('ttfb', time.perf_counter() - context.started)
+
+    trace = TraceConfig()
+    trace.on_request_start.append(on_request_start)
+    trace.on_connection_create_start.append(on_connect_start)
+    trace.on_connection_create_end.append(on_connect_end)
+    trace.on_request_end.append(on_request_end)
+    return trace
+
+def make_session(limit: int = 100, limit_per_host: int = 10, dns_ttl: int = 300,
+                 keepalive: float = 30, stats: dict = None, metrics: Metrics = None) -> ClientSession:
+    """builds the one session shared by every crawl phase
+
+    limit caps open sockets across all hosts and limit_per_host caps them per host,
+    so gathering thousands of urls queues on the pool instead of opening thousands of sockets;
+    idle connections are kept alive for reuse and DNS lookups are cached for dns_ttl seconds
+    """
+    connector = TCPConnector(
+        limit=limit,
+        limit_per_host=limit_per_host,
+        use_dns_cache=True,
+        ttl_dns_cache=dns_ttl,
+        keepalive_timeout=keepalive,
+    )
+    trace_configs = []
+    if stats is not None:
+        trace_configs.append(count_connections(stats))
+    if metrics is not None:
+        trace_configs.append(trace_latency(metrics))
+    return ClientSession(connector=connector, trace_configs=trace_configs or None)
+
+async def make_requests(urls: set, proxies: list, session: ClientSession = None, **kwargs) -> list:
+    """asynchronously make http requests
+    reuses session when given, otherwise opens a pooled one for this call
+    urls that exhaust their retries are left out of the results
+    """
+    if session is None:
+        async with make_session() as session:
+            return await make_requests(urls, proxies, session=session, **kwargs)
+
+    tasks = [
+        fetch_html(url, session=session, proxies=proxies, **kwargs)
+        for url in urls
+    ]
+    results = []
+    for result in await asyncio.gather(*tasks, return_exceptions=True):
+        if isinstance(result, RetriesExhausted):
+            print(f'giving up: {result}')
+        elif isinstance(result, BaseException):
+            raise result
+        else:
+            results.append(result)
+    return results
+
+async def crawl(category_links: set, proxies: list, sink=None, workers: int = 100,
+                maxsize: int = 100, parsers: int = None, cache: ResponseCache = None,
+                frontier: Frontier = None, metrics: Metrics = None, policy: RetryPolicy = None,
+                limiter: AdaptiveLimiter = None, limit_per_host: int = 10) -> int:
+    """streams the catalog through bounded queues
+    category fetch -> link extraction -> product fetch -> json extraction -> sink
+
+    each product link is fetched as soon as its category page is parsed,
+    and bounded queues keep no more than maxsize pages in memory per stage
+    both extraction stages parse in a pool of parsers processes
+
+    urls already pending in frontier are crawled along with category_links,
+    product links are deduplicated on product ID and known urls are never queued twice;
+    sink(product, url) must mark url done once the product is stored,
+    as ProductSink(on_commit=frontier.finish) does; by default products are printed
+
+    stage timings and request counters go to metrics,
+    with a progress line printed every metrics.interval seconds
+
+    every url is fetched in a task of its own, with up to workers per fetch stage in progress,
+    so the random pause before each request never holds up the others;
+    all fetches share one retry policy (and so one retry budget)
+    and one limiter, which adapts the number of requests in flight
+    between 1 and limit_per_host, the session's connection cap per host,
+    since requests above it would only queue for a connection inside the pool
+    returns number of products handed to sink
+    """
+    loop = asyncio.get_running_loop()
+    category_queue = asyncio.Queue()
+    category_html = asyncio.Queue(maxsize)
+    product_queue = asyncio.Queue(maxsize)
+    product_html = asyncio.Queue(maxsize)
+    product_data = asyncio.Queue(maxsize)
+    seen = HashedSet()
+    stored = 0
+    duplicates = 0
+    metrics = metrics or Metrics()
+    policy = policy or RetryPolicy()
+    limiter = limiter or AdaptiveLimiter(initial=limit_per_host, maximum=limit_per_host)
+    running = set()
+
+    if frontier is None:
+        frontier = Frontier(':memory:')
+    if sink is None:
+        def sink(product: dict, url: str) -> None:
+            print(product)
+            frontier.finish([url])
+
+    frontier.add(category_links, 'category')
+    for link in frontier.pending('category'):
+        category_queue.put_nowait(link)
+
+    async def progress() -> None:
+        while True:
+            await asyncio.sleep(metrics.interval)
+            metrics.report(force=True)
+
+    async def parse(func, html: bytes):
+        result, seconds = await loop.run_in_executor(pool, timed_call, func, html)
+        metrics.observe('parse', seconds)
+        return result
+
+    async def resume() -> None:
+        for link in frontier.pending('product'):
+            await product_queue.put(link)
+
+    async def fetch_one(url: str, inbox: asyncio.Queue, outbox: asyncio.Queue, session: ClientSession,
+                        slots: asyncio.Semaphore) -> None:
+        try:
+            frontier.claim(url)
+            await outbox.put((url, await fetch_html(
+                url, session=session, proxies=proxies, cache=cache, metrics=metrics, policy=policy, limiter=limiter
+            )))
+        except Exception as e:
+            print(f'failed to fetch {url}: {e!r}')
+            frontier.fail(url)
+        finally:
+            inbox.task_done()
+            slots.release()
+
+    async def fetch(inbox: asyncio.Queue, outbox: asyncio.Queue, session: ClientSession) -> None:
+        slots = asyncio.Semaphore(workers)
+        while True:
+            url = await inbox.get()
+            await slots.acquire()
+            task = asyncio.create_task(fetch_one(url, inbox, outbox, session, slots))
+            running.add(task)
+            task.add_done_callback(running.discard)
+
+    async def extract_links() -> None:
+        nonlocal duplicates
+        while True:
+            url, html = await category_html.get()
+            try:
+                links = await parse(parse_product_links, html)
+                new = [link for key, link in links if seen.add(key)]
+                duplicates += len(links) - len(new)
+                for link in frontier.add(new, 'product'):
+                    await product_queue.put(link)
+                frontier.finish([url])
+            except Exception as e:
+                print(f'no product links at {url}: {e!r}')
+                frontier.fail(url)
+            finally:
+                category_html.task_done()
+
+    async def extract_data() -> None:
+        while True:
+            url, html = await product_html.get()
+            try:
+                await product_data.put((url, await parse(parse_product_page, html)))
+            except Exception as e:
+                print(f'no product data at {url}: {e!r}')
+                frontier.fail(url)
+            finally:
+                product_html.task_done()
+
+    async def store() -> None:
+        nonlocal stored
+        while True:
+            url, product = await product_data.get()
+            try:
+                sink(product, url)
+                stored += 1
+                metrics.count('products')
+            except Exception as e:
+                print(f'failed to store product from {url}: {e!r}')
+                frontier.fail(url)
+            finally:
+                product_data.task_done()
+
+    parsers = parsers or os.cpu_count()
+    with make_pool(parsers) as pool:
+        async with make_session(limit_per_host=limit_per_host, metrics=metrics) as session:
+            seeding = asyncio.create_task(resume())
+            tasks = [
+                asyncio.create_task(progress()),
+                asyncio.create_task(fetch(category_queue, category_html, session)),
+                asyncio.create_task(fetch(product_queue, product_html, session)),
+                *(asyncio.create_task(extract_links()) for _ in range(parsers)),
+                *(asyncio.create_task(extract_data()) for _ in range(parsers)),
+                asyncio.create_task(store()),
+            ]
+            # each queue can only receive work from the stages before it,
+            # so joining them in pipeline order means the whole crawl is drained
+            await seeding
+            for queue in (category_queue, category_html, product_queue, product_html, product_data):
+                await queue.join()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    metrics.report(force=True)
+    print(f'streamed {stored} products, skipped {duplicates} duplicate product links, '
+          f'ended with {int(limiter.limit)} requests in flight, frontier {frontier.counts()}')
+    return stored
+
+async def fetch_phases(category_links: set, cache: ResponseCache = None, metrics: Metrics = None,
+                       use_proxies: bool = True, limit_per_host: int = 10) -> list:
+    """fetches every category page, then every product page,
+    over one pooled session shared by both loops
+    with a shared retry policy and an adaptive limiter capped at the session's limit_per_host
+    """
+    policy = RetryPolicy()
+    limiter = AdaptiveLimiter(maximum=limit_per_host)
+    async with make_session(limit_per_host=limit_per_host, metrics=metrics) as session:
+        print('beginning loop 1')
+        proxies = call_proxies() if use_proxies else []
+        category_html = await make_requests(urls=category_links, proxies=proxies, session=session, cache=cache,
+                                            metrics=metrics, policy=policy, limiter=limiter)
+        print('finished loop 1')
+
+        product_links = soup_products(category_html)
+
+        print('beginning loop 2')
+        proxies = call_proxies() if use_proxies else []
+        products = await make_requests(urls=product_links, proxies=proxies, session=session, cache=cache,
+                                        metrics=metrics, policy=policy, limiter=limiter)
+        print('finished loop 2')
+    return products
+
+def main(url: str, stream: bool = True, cache_dir: str = '.macys_cache',
+         frontier_path: str = 'macys_frontier.db', recrawl_after: float = None,
+         metrics: Metrics = None, prometheus_path: str = None, use_proxies: bool = True,
+         parquet_dir: str = None, columnar_format: str = 'parquet', changes_only: bool = False,
+         workers: int = 100, limit_per_host: int = 10) -> None:
     """begins function calls
     index page -> category links -> product links -> product data
+
+    with stream, pages flow through crawl() one at a time
+    instead of each phase waiting on every page of the last
+    without use_proxies, requests go straight to the origin
+    up to workers fetches per streaming stage are in progress at once,
+    with at most limit_per_host requests in flight to the origin
+    responses are cached in cache_dir between runs; pass None to disable
+
+    the streaming crawl keeps every url's progress in the frontier at frontier_path,
+    so an interrupted run picks up where it stopped and skips completed work;
+    with recrawl_after (seconds), urls fetched longer ago than that are crawled again
+
+    with changes_only, a product is only written to the products table when its price, availability,
+    price_valid_until or description differ from the last tracked crawl, and the change is logged
+
+    with parquet_dir, products are also written there as date/category-partitioned
+    Parquet (or Arrow IPC with columnar_format='arrow'); the frontier follows the SQLite commits
+
+    wall-clock timings go to metrics and are printed as a JSON summary at the end,
+    with a Prometheus text dump written to prometheus_path when given
     """
-    category_links = get_category_href(url)
-    
-    print('beginning loop 1')
-    proxies = call_proxies()
-    loop = asyncio.get_event_loop()
-    category_html = loop.run_until_complete(make_requests(urls=category_links, proxies=proxies))
-    print('finished loop 1')
+    metrics = metrics or Metrics()
+    cache = ResponseCache(cache_dir) if cache_dir else None
+    category_links = get_category_href(url, cache, metrics)
 
-    product_links = soup_products(category_html)
+    if stream:
+        proxies = call_proxies() if use_proxies else []
+        with Frontier(frontier_path) as frontier:
+            frontier.resume(recrawl_after)
+            with ProductSink(on_commit=frontier.finish, metrics=metrics, changes_only=changes_only) as sink, \
+                    ExitStack() as stack:
+                if parquet_dir:
+                    columnar = stack.enter_context(ParquetSink(parquet_dir, format=columnar_format))
 
-    print('beginning loop 2')
-    proxies = call_proxies()
-    loop2 = asyncio.get_event_loop()
-    products = loop2.run_until_complete(make_requests(urls=product_links, proxies=proxies))
-    print('finished loop 2')
+                    def store(product, url):
+                        sink.add(product, url)
+                        columnar.add(product)
+                else:
+                    store = sink.add
+                asyncio.run(crawl(
+                    category_links, proxies=proxies, sink=store, workers=workers, cache=cache, frontier=frontier,
+                    metrics=metrics, limit_per_host=limit_per_host
+                ))
+        print(f'pushed {sink.written} products to SQL table')
+        if changes_only:
+            print(f'{sink.unchanged} unchanged products skipped')
+        if parquet_dir:
+            print(f'wrote {columnar.written} products to {parquet_dir}')
+    else:
+        products = asyncio.run(fetch_phases(category_links, cache, metrics, use_proxies, limit_per_host))
+        product_data = soup_product_data(products)
+        metrics.count('products', len(product_data))
+        print(product_data)
 
-    product_data = soup_product_data(products)
-    print(product_data)
+    if cache is not None:
+        print(f'response cache: {cache.report()}')
+        cache.close()
+    print(metrics.to_json())
+    if prometheus_path:
+        with open(prometheus_path, 'w') as f:
+            f.write(metrics.prometheus())
 
 if __name__ == '__main__':
+    import argparse
     import pathlib
     import sys
 
     assert sys.version_info >= (3, 7), "Script requires Python 3.7+."
     here = pathlib.Path(__file__).parent
-    
-    url = 'https://www.macys.com/shop/sitemap-index?id=199462'
 
-    start = time.process_time()
-    main(url)
-    end = time.process_time()
+    parser = argparse.ArgumentParser(description="stream Macy's products into macys_products.db")
+    parser.add_argument('--phased', action='store_true', help='fetch every page of each phase before the next')
+    parser.add_argument('--no-proxies', action='store_true', help='request the origin directly')
+    parser.add_argument('--workers', type=int, default=100, help='fetches in progress per streaming stage')
+    parser.add_argument('--limit-per-host', type=int, default=10, help='connections per host, and so requests in flight')
+    parser.add_argument('--frontier', default='macys_frontier.db', help='frontier database tracking every url between runs')
+    parser.add_argument('--recrawl-after', type=float, metavar='SECONDS',
+                        help='crawl again urls fetched, or failed, more than SECONDS ago, e.g. 86400 for a daily recrawl')
+    parser.add_argument('--changes-only', action='store_true', help='write only products that changed since the last crawl')
+    parser.add_argument('--parquet', metavar='DIR', help='also write products to DIR as partitioned Parquet')
+    parser.add_argument('--prometheus', metavar='PATH', help='write a Prometheus text dump of the crawl metrics to PATH')
+    args = parser.parse_args()
+
+    url = INDEX_URL
+
+    start = time.perf_counter()
+    main(url, stream=not args.phased, frontier_path=args.frontier, recrawl_after=args.recrawl_after,
+         prometheus_path=args.prometheus, use_proxies=not args.no_proxies,
+         parquet_dir=args.parquet, changes_only=args.changes_only,
+         workers=args.workers, limit_per_host=args.limit_per_host)
+    end = time.perf_counter()
     print(f'script executed in {end - start} seconds')
\ No newline at end of file
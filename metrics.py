@@ -0,0 +1,179 @@
+"""Crawl instrumentation shared by both scrapers
+wall-clock latency histograms per stage, in-flight gauges, byte and status counters,
+a periodic progress line, a JSON summary and a Prometheus-style text dump
+
+stages: connect (DNS + TCP/TLS), ttfb, body, parse, db_write
+"""
+
+import bisect
+import json
+import math
+import time
+from array import array
+from collections import Counter
+from contextlib import contextmanager
+
+# upper bounds in seconds, roughly doubling from 1ms to 1 minute
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+def timed_call(func, *args):
+    """runs func(*args) and returns (result, seconds)
+    picklable, so pool workers can time parsing where it actually happens
+    """
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+class Histogram:
+    """fixed-bucket latency histogram
+    with samples, every observation is also kept (8 bytes each) so quantiles are exact
+    """
+
+    def __init__(self, buckets: tuple = BUCKETS, samples: bool = False):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.samples = array('d') if samples else None
+
+    def record(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if self.samples is not None:
+            self.samples.append(seconds)
+
+    def quantile(self, q: float) -> float:
+        """the q-th quantile (nearest rank) when samples are kept,
+        otherwise the upper bound of the bucket holding it
+        """
+        if not self.count:
+            return 0.0
+        if self.samples is not None:
+            return sorted(self.samples)[max(0, math.ceil(q * self.count) - 1)]
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets + (float('inf'),), self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def summary(self) -> dict:
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+        }
+
+class Metrics:
+    """everything measured during one crawl
+
+    with samples, stage quantiles are exact rather than bucket bounds,
+    at the cost of keeping every observation, e.g. for benchmarks
+
+    usage:
+        with metrics.timer('parse'):
+            ...
+        metrics.report()        # prints a progress line every interval seconds
+        print(metrics.to_json())
+    """
+
+    def __init__(self, interval: float = 10, samples: bool = False):
+        self.samples = samples
+        self.started = time.perf_counter()
+        self.interval = interval
+        self.reported = self.started
+        self.stages = {}
+        self.counters = Counter()
+        self.statuses = Counter()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def observe(self, stage: str, seconds: float) -> None:
+        if stage not in self.stages:
+            self.stages[stage] = Histogram(samples=self.samples)
+        self.stages[stage].record(seconds)
+
+    @contextmanager
+    def timer(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    @contextmanager
+    def request(self):
+        """tracks one request in flight"""
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+
+    def response(self, status: int, size: int) -> None:
+        """counts one finished response and its body bytes"""
+        self.statuses[status] += 1
+        self.counters['requests'] += 1
+        self.counters['bytes'] += size
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] += n
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def progress(self) -> str:
+        elapsed = self.elapsed()
+        return (
+            f'{elapsed:.1f}s: {self.counters["requests"]} requests '
+            f'({self.counters["requests"] / elapsed:.1f}/s), {self.in_flight} in flight, '
+            f'{self.counters["bytes"] / 1e6:.1f} MB, {self.counters["products"]} products, '
+            f'statuses {dict(self.statuses)}'
+        )
+
+    def report(self, force: bool = False) -> None:
+        """prints a progress line if interval seconds have passed since the last one"""
+        now = time.perf_counter()
+        if force or now - self.reported >= self.interval:
+            self.reported = now
+            print(self.progress())
+
+    def summary(self) -> dict:
+        return {
+            'elapsed': self.elapsed(),
+            'counters': dict(self.counters),
+            'statuses': {str(status): n for status, n in self.statuses.items()},
+            'peak_in_flight': self.peak_in_flight,
+            'stages': {stage: histogram.summary() for stage, histogram in self.stages.items()},
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.summary(), indent=2)
+
+    def prometheus(self, prefix: str = 'macys') -> str:
+        """Prometheus text exposition format"""
+        lines = [
+            f'# TYPE {prefix}_stage_seconds histogram',
+        ]
+        for stage, histogram in self.stages.items():
+            cumulative = 0
+            for bound, n in zip(histogram.buckets + (float('inf'),), histogram.counts):
+                cumulative += n
+                le = '+Inf' if bound == float('inf') else f'{bound:g}'
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {histogram.total}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+        lines.append(f'# TYPE {prefix}_responses_total counter')
+        for status, n in sorted(self.statuses.items()):
+            lines.append(f'{prefix}_responses_total{{status="{status}"}} {n}')
+        for name, n in sorted(self.counters.items()):
+            lines.append(f'# TYPE {prefix}_{name}_total counter')
+            lines.append(f'{prefix}_{name}_total {n}')
+        lines.append(f'# TYPE {prefix}_in_flight gauge')
+        lines.append(f'{prefix}_in_flight {self.in_flight}')
+        return '\n'.join(lines) + '\n'
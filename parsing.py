@@ -0,0 +1,157 @@
+"""HTML parsing shared by both scrapers
+BeautifulSoup is pure Python and holds the GIL, so parsing runs in worker processes:
+raw page bytes go in and only the small extracted results (link sets, product dicts) come back
+
+extraction is pluggable through BACKENDS: the default 'scan' backend reads only
+the target tags with regular expressions, and 'soup' builds the full BeautifulSoup tree
+"""
+
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from html import unescape
+
+from bs4 import BeautifulSoup
+
+from product import Product, parse_product
+
+# MACYS_BASE_URL points both scrapers at a stand-in server, e.g. for bench_crawl.py
+BASE_URL = os.environ.get('MACYS_BASE_URL', 'https://www.macys.com')
+INDEX_URL = f'{BASE_URL}/shop/sitemap-index?id=199462'
+
+def format_link(url: str) -> str:
+    """ensures returned url starts with https://www.macys.com (or BASE_URL)"""
+    if url.startswith('/shop/'):
+        return BASE_URL + url
+    if url.startswith('//www') and len(url) > 5:
+        return 'https:' + url
+    if not url.startswith('https://'):
+        return 'https://' + url
+    return url
+
+# one line per link: a product link keeps its path and its ID parameter,
+# every other parameter (CategoryID, tracking) is dropped
+CANONICAL = re.compile(r'^(?:(' + re.escape(BASE_URL) + r'/shop/[^?#\n]*)\?(?:[^#\n]*?&)?ID=(\d+)(?![^&#\n]))?[^\n]*$', re.M)
+
+def canonical_links(links) -> list:
+    """canonicalizes a batch of formatted links in one regex pass
+    returns (key, url) pairs in sorted link order, where key is the product ID,
+    or the link itself for links without one, so duplicates can be dropped by identity
+    """
+    pairs = []
+    for match in CANONICAL.finditer('\n'.join(sorted(links))):
+        path, product_id = match.groups()
+        if product_id:
+            pairs.append((product_id, f'{path}?ID={product_id}'))
+        else:
+            pairs.append((match.group(), match.group()))
+    return pairs
+
+SHOP = re.compile('/shop')
+# an opening tag runs to the first > outside a quoted attribute value
+TAG_BODY = rb'''(?:[^>"']|"[^"]*"|'[^']*')*'''
+# comments and script/style bodies are matched as whole spans so nothing inside them
+# is mistaken for markup, as BeautifulSoup does; only the last group is a real tag
+# (the shared leading < is factored out, which keeps the scan as fast as a bare tag search)
+SKIPPED = rb'!--.*?-->|(script|style)\b(' + TAG_BODY + rb')>(.*?)</\1\s*>'
+ANCHOR = re.compile(rb'<(?:' + SKIPPED + rb'|(a\s' + TAG_BODY + rb')>)', re.I | re.S)
+ELEMENT = re.compile(rb'<(?:' + SKIPPED + rb')', re.I | re.S)
+ATTRIBUTE = re.compile(rb'''([^\s=/>]+)\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))''')
+
+def links_with_soup(html: bytes) -> set:
+    """turns one category page to BeautifulSoup
+    and returns its formatted product links
+    """
+    return {
+        format_link(i.get('href'))
+        for i in BeautifulSoup(html, 'html.parser').find_all('a', {'class': 'productDescLink'}, href=SHOP)
+    }
+
+def data_with_soup(html: bytes) -> dict:
+    """turns one product page to BeautifulSoup
+    and returns its json product data
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    return json.loads(soup.find('script', {'id': 'productMktData'}).text)
+
+def _as_bytes(html) -> bytes:
+    return html.encode('utf-8') if isinstance(html, str) else html
+
+def _attributes(tag: bytes) -> dict:
+    """attribute values of one opening tag, unescaped like BeautifulSoup does"""
+    return {
+        name.lower().decode('utf-8', 'replace'): unescape(b''.join(value).decode('utf-8', 'replace'))
+        for name, *value in ATTRIBUTE.findall(tag)
+    }
+
+def links_with_scan(html: bytes) -> set:
+    """scans the raw page for a.productDescLink tags
+    without building a tree of the rest of the document
+    """
+    links = set()
+    for match in ANCHOR.finditer(_as_bytes(html)):
+        tag = match.group(4)
+        if tag is None or b'productDescLink' not in tag:
+            continue
+        attributes = _attributes(tag)
+        href = attributes.get('href')
+        if 'productDescLink' in attributes.get('class', '').split() and href and SHOP.search(href):
+            links.add(format_link(href))
+    return links
+
+def data_with_scan(html: bytes) -> dict:
+    """scans the raw page for the productMktData script
+    returns None when it cannot be found
+    """
+    for match in ELEMENT.finditer(_as_bytes(html)):
+        name, attributes, body = match.groups()
+        if name is None or name.lower() != b'script' or b'productMktData' not in attributes:
+            continue
+        if _attributes(attributes).get('id') == 'productMktData':
+            return json.loads(body.decode('utf-8'))
+    return None
+
+# each backend pairs a link extractor with a product data extractor
+BACKENDS = {
+    'scan': (links_with_scan, data_with_scan),
+    'soup': (links_with_soup, data_with_soup),
+}
+
+def parse_product_links(html: bytes, backend: str = 'scan') -> list:
+    """returns canonical (key, url) product link pairs from one category page
+    falls back to BeautifulSoup when the backend finds none
+    """
+    links = BACKENDS[backend][0](html)
+    if not links and backend != 'soup':
+        links = links_with_soup(html)
+    return canonical_links(links)
+
+def parse_product_data(html: bytes, backend: str = 'scan') -> dict:
+    """returns json product data from one product page
+    falls back to BeautifulSoup when the backend finds none
+    """
+    try:
+        product = BACKENDS[backend][1](html)
+    except ValueError:
+        if backend == 'soup':
+            raise
+        product = None
+    if product is None and backend != 'soup':
+        product = data_with_soup(html)
+    return product
+
+def parse_product_page(html: bytes) -> Product:
+    """returns the Product on one product page"""
+    return parse_product(parse_product_data(html))
+
+def make_pool(workers: int = None) -> ProcessPoolExecutor:
+    """process pool for parsing, one worker per core by default"""
+    return ProcessPoolExecutor(max_workers=workers or os.cpu_count())
+
+def parse_pages(pages: list, parse, workers: int = None, chunksize: int = 4) -> list:
+    """parses every page across a process pool
+    results come back in the order of pages
+    """
+    with make_pool(workers) as pool:
+        return list(pool.map(parse, pages, chunksize=chunksize))
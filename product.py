@@ -0,0 +1,79 @@
+"""Compact product record shared by both scrapers
+parse_product turns a page's productMktData json into a Product once,
+and every sink (SQLite, Parquet) reads the same typed fields from it
+"""
+
+from operator import attrgetter
+
+FIELDS = (
+    'product_id', 'name', 'category', 'image', 'url', 'product_type', 'brand',
+    'description', 'currency', 'price', 'sku', 'availability', 'price_valid_until',
+)
+
+_fields = attrgetter(*FIELDS)
+
+class Product:
+    """one product's fields, in FIELDS order
+    __slots__ keeps each record to a fixed handful of references,
+    and unlike the json dict it is hashable, so products can go in sets
+    """
+
+    __slots__ = FIELDS
+
+    def __init__(self, product_id: int, name: str = None, category: str = None, image: str = None,
+                 url: str = None, product_type: str = None, brand: str = None, description: str = None,
+                 currency: str = None, price: float = None, sku: str = None, availability: str = None,
+                 price_valid_until: str = None):
+        self.product_id = product_id
+        self.name = name
+        self.category = category
+        self.image = image
+        self.url = url
+        self.product_type = product_type
+        self.brand = brand
+        self.description = description
+        self.currency = currency
+        self.price = price
+        self.sku = sku
+        self.availability = availability
+        self.price_valid_until = price_valid_until
+
+    def astuple(self) -> tuple:
+        return _fields(self)
+
+    def __eq__(self, other):
+        if not isinstance(other, Product):
+            return NotImplemented
+        return self.astuple() == other.astuple()
+
+    def __hash__(self):
+        return hash(self.astuple())
+
+    def __repr__(self):
+        return f'Product(product_id={self.product_id!r}, name={self.name!r}, price={self.price!r})'
+
+    def __getstate__(self):
+        return self.astuple()
+
+    def __setstate__(self, state):
+        for field, value in zip(FIELDS, state):
+            setattr(self, field, value)
+
+def parse_product(data: dict) -> Product:
+    """reads one product's productMktData json into a Product"""
+    offer = data.get('offers')[0]
+    return Product(
+        product_id=int(data.get('productID')),
+        name=data.get('name'),
+        category=data.get('category'),
+        image=data.get('image'),
+        url=data.get('url'),
+        product_type=data.get('@type'),
+        brand=data.get('brand').get('name'),
+        description=data.get('description'),
+        currency=offer.get('priceCurrency'),
+        price=float(offer.get('price')),
+        sku=offer.get('SKU'),
+        availability=offer.get('availability'),
+        price_valid_until=offer.get('priceValidUntil'),
+    )
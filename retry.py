@@ -0,0 +1,130 @@
+"""Retry, backoff and concurrency policy shared by both scrapers
+
+RetryPolicy bounds every request with connect/read timeouts and retries
+timeouts, connection errors and 429/5xx responses with exponential backoff and full jitter,
+honouring Retry-After; retries draw on a budget refilled by ordinary requests,
+so a failing origin is not flooded with retries
+
+AdaptiveLimiter caps requests in flight AIMD-style: the limit grows by one
+per limit successes and halves when errors or slow responses appear;
+a response is slow when the whole request, headers and body, takes over latency_target seconds
+"""
+
+import asyncio
+import email.utils
+import random
+import time
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+class RetriesExhausted(Exception):
+    """raised once a url has failed more times than the policy allows"""
+
+def parse_retry_after(value: str) -> float:
+    """seconds to wait from a Retry-After header, given as seconds or an HTTP date"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+class RetryPolicy:
+    """how long to wait on a request, and whether and when to try it again
+
+    budget_ratio: retries allowed per ordinary request, e.g. 0.2 lets one request in five retry
+    budget_max: retries banked up front, and the most the budget can hold
+    """
+
+    def __init__(self, attempts: int = 4, connect_timeout: float = 10, read_timeout: float = 30,
+                 base_delay: float = 0.5, max_delay: float = 30, max_retry_after: float = 120,
+                 budget_ratio: float = 0.2, budget_max: float = 10, statuses=RETRY_STATUSES):
+        self.attempts = attempts
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self.budget_ratio = budget_ratio
+        self.budget_max = budget_max
+        self.statuses = statuses
+        self.tokens = budget_max
+
+    def started(self) -> None:
+        """pays one ordinary request into the retry budget"""
+        self.tokens = min(self.budget_max, self.tokens + self.budget_ratio)
+
+    def retryable(self, status: int) -> bool:
+        return status in self.statuses
+
+    def should_retry(self, attempt: int) -> bool:
+        """whether attempt (counted from 0) may be followed by another, spending from the budget"""
+        if attempt + 1 >= self.attempts or self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def backoff(self, attempt: int, retry_after: str = None) -> float:
+        """seconds to sleep before the next attempt:
+        full jitter over an exponential ceiling, or the server's Retry-After when it asks for longer
+        """
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        asked = parse_retry_after(retry_after)
+        if asked is not None:
+            delay = max(delay, min(asked, self.max_retry_after))
+        return delay
+
+class AdaptiveLimiter:
+    """async context manager holding requests in flight under an AIMD limit
+
+    maximum should not exceed the connection pool's per-host limit,
+    or time spent queuing for a connection is counted as origin latency;
+    pass latency_target=None to shrink on errors only
+
+    usage:
+        async with limiter:
+            ... make the request ...
+            limiter.record(ok, latency)
+    """
+
+    def __init__(self, initial: int = 10, minimum: int = 1, maximum: int = 100,
+                 decrease: float = 0.5, latency_target: float = 5.0, cooldown: float = 1.0):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease
+        self.latency_target = latency_target
+        self.cooldown = cooldown
+        self.active = 0
+        self._decreased = 0.0
+        self._condition = None
+
+    async def __aenter__(self):
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.active < int(self.limit))
+            self.active += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        async with self._condition:
+            self.active -= 1
+            self._condition.notify_all()
+
+    def record(self, ok: bool, latency: float = None) -> None:
+        """grows the limit after a healthy response and shrinks it after an error or a slow one;
+        shrinking happens at most once per cooldown so one burst of errors is one decrease
+        """
+        slow = self.latency_target is not None and latency is not None and latency > self.latency_target
+        if ok and not slow:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            return
+        now = time.monotonic()
+        if now - self._decreased >= self.cooldown:
+            self.limit = max(self.minimum, self.limit * self.decrease)
+            self._decreased = now
@@ -0,0 +1,251 @@
+"""SQLite storage for scraped products
+ProductSink stays open for the whole crawl and takes products as they stream in,
+committing every batch_size rows so a crash only loses the current batch
+
+with changes_only, each product's tracked fields are hashed and compared with
+the hash kept in product_state; only new or changed products are written,
+and every change is appended to product_changes for price_history()
+tracking costs a lookup and two extra inserts per changed row, so it is opt-in;
+plain runs only drop the state of the products they overwrite, so it never goes stale
+"""
+
+import sqlite3
+import time
+from contextlib import closing, nullcontext
+from hashlib import blake2b
+from operator import attrgetter
+
+from product import FIELDS as COLUMNS, Product
+
+CREATE = """CREATE TABLE IF NOT EXISTS products (
+    product_id INT,
+    name VARCHAR(255),
+    category VARCHAR(255),
+    image VARCHAR(500),
+    url VARCHAR(500),
+    product_type VARCHAR(50),
+    brand VARCHAR(255),
+    description VARCHAR(500),
+    currency VARCHAR(5),
+    price FLOAT,
+    sku VARCHAR(15),
+    availability VARCHAR(100),
+    price_valid_until VARCHAR(25)
+);
+"""
+
+# older runs appended a copy of every product on each crawl;
+# the older copies, the only price history those runs kept, are moved to products_history
+# and the newest row per product stays, so product_id can be made unique
+OLDER_COPIES = 'rowid NOT IN (SELECT MAX(rowid) FROM products GROUP BY product_id)'
+
+CREATE_HISTORY = 'CREATE TABLE IF NOT EXISTS products_history AS SELECT * FROM products WHERE 0;'
+
+ARCHIVE = f'INSERT INTO products_history SELECT * FROM products WHERE {OLDER_COPIES};'
+
+DEDUPLICATE = f'DELETE FROM products WHERE {OLDER_COPIES};'
+
+UNIQUE = 'CREATE UNIQUE INDEX IF NOT EXISTS products_product_id ON products (product_id);'
+
+UPSERT = ''.join([
+    f'INSERT INTO products ({", ".join(COLUMNS)}) VALUES ({", ".join(["?"] * len(COLUMNS))}) ',
+    'ON CONFLICT (product_id) DO UPDATE SET ',
+    ', '.join(f'{column} = excluded.{column}' for column in COLUMNS[1:]),
+    ';',
+])
+
+# fields whose change between crawls is worth a row in product_changes
+TRACKED = ('price', 'availability', 'price_valid_until', 'description')
+
+_tracked = attrgetter(*TRACKED)
+
+CREATE_STATE = """CREATE TABLE IF NOT EXISTS product_state (
+    product_id INTEGER PRIMARY KEY,
+    hash BLOB NOT NULL,
+    first_seen REAL NOT NULL,
+    changed_at REAL NOT NULL
+);
+"""
+
+CREATE_CHANGES = """CREATE TABLE IF NOT EXISTS product_changes (
+    product_id INT NOT NULL,
+    changed_at REAL NOT NULL,
+    currency VARCHAR(5),
+    price FLOAT,
+    availability VARCHAR(100),
+    price_valid_until VARCHAR(25),
+    description VARCHAR(500)
+);
+"""
+
+CHANGES_INDEX = 'CREATE INDEX IF NOT EXISTS product_changes_product_id ON product_changes (product_id, changed_at);'
+
+UPSERT_STATE = """INSERT INTO product_state (product_id, hash, first_seen, changed_at) VALUES (?, ?, ?, ?)
+ON CONFLICT (product_id) DO UPDATE SET hash = excluded.hash, changed_at = excluded.changed_at;
+"""
+
+INSERT_CHANGE = """INSERT INTO product_changes
+(product_id, changed_at, currency, price, availability, price_valid_until, description)
+VALUES (?, ?, ?, ?, ?, ?, ?);
+"""
+
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL;',
+    'PRAGMA synchronous = NORMAL;',
+    'PRAGMA temp_store = MEMORY;',
+    'PRAGMA cache_size = -65536;',
+)
+
+def connect(path: str) -> sqlite3.Connection:
+    """opens the database in WAL mode with the products table ready for upserts
+    transactions are managed explicitly, so autocommit is left on
+    a table from before the unique index has its older duplicate rows moved to products_history
+    """
+    conn = sqlite3.connect(path, isolation_level=None)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    conn.execute('BEGIN;')
+    conn.execute(CREATE)
+    conn.execute(CREATE_STATE)
+    conn.execute(CREATE_CHANGES)
+    conn.execute(CHANGES_INDEX)
+    if conn.execute('SELECT 1 FROM sqlite_master WHERE name = ?;', ('products_product_id',)).fetchone() is None:
+        conn.execute(CREATE_HISTORY)
+        archived = conn.execute(ARCHIVE).rowcount
+        conn.execute(DEDUPLICATE)
+        conn.execute(UNIQUE)
+        if archived:
+            print(f'moved {archived} older duplicate product rows to products_history')
+    conn.execute('COMMIT;')
+    return conn
+
+def fingerprint(product: Product) -> bytes:
+    """8-byte blake2b digest of the product's TRACKED fields"""
+    values = '\x1f'.join(map(str, _tracked(product)))
+    return blake2b(values.encode('utf-8'), digest_size=8).digest()
+
+def _chunks(ids: list, size: int = 900):
+    """ids in chunks that stay under SQLite's default limit of 999 bound parameters"""
+    for i in range(0, len(ids), size):
+        chunk = ids[i:i + size]
+        yield chunk, ', '.join(['?'] * len(chunk))
+
+def price_history(conn, product_id: int) -> list:
+    """every recorded change for product_id, oldest first, as
+    (changed_at, currency, price, availability, price_valid_until) tuples
+    conn is an open connection or a database path
+    """
+    if isinstance(conn, str):
+        with closing(sqlite3.connect(conn)) as opened:
+            return price_history(opened, product_id)
+    return conn.execute(
+        'SELECT changed_at, currency, price, availability, price_valid_until FROM product_changes '
+        'WHERE product_id = ? ORDER BY changed_at;', (product_id,)
+    ).fetchall()
+
+class ProductSink:
+    """long-lived writer that upserts products on product_id in batches
+
+    on_commit, when given, is called after each commit with the keys
+    passed to add() for that batch, e.g. to mark their urls done in a Frontier;
+    with metrics, each batch write is timed as the db_write stage
+
+    with changes_only, products whose TRACKED fields hash the same as last time
+    are skipped and counted in unchanged; the rest are upserted into products
+    and product_state, and appended to product_changes
+    without it, rows are upserted as they come, and any product_state kept for them
+    by an earlier changes_only run is dropped, so the next one logs them afresh
+
+    usage:
+        with ProductSink('macys_products.db') as sink:
+            sink.add(product)
+    """
+
+    def __init__(self, path: str = 'macys_products.db', batch_size: int = 500, on_commit=None, metrics=None,
+                 changes_only: bool = False):
+        self.conn = connect(path)
+        self.changes_only = changes_only
+        self.batch_size = batch_size
+        self.on_commit = on_commit
+        self.metrics = metrics
+        self.rows = []
+        self.keys = []
+        self.written = 0
+        self.unchanged = 0
+        # whether an earlier changes_only run left state behind; until one has, there is nothing to look up
+        self.tracked = self.conn.execute('SELECT 1 FROM product_state LIMIT 1;').fetchone() is not None
+
+    def add(self, product: Product, key=None) -> None:
+        """queues one product, committing once a full batch is waiting"""
+        self.rows.append(product)
+        if key is not None:
+            self.keys.append(key)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """writes every waiting row in one transaction"""
+        if not self.rows:
+            return
+        with self.metrics.timer('db_write') if self.metrics else nullcontext():
+            self.conn.execute('BEGIN;')
+            try:
+                if self.changes_only:
+                    rows = self._changed(self.rows)
+                else:
+                    rows = self.rows
+                    if self.tracked:
+                        self._forget(rows)
+                self.conn.executemany(UPSERT, [product.astuple() for product in rows])
+            except BaseException:
+                self.conn.execute('ROLLBACK;')
+                raise
+            self.conn.execute('COMMIT;')
+        self.written += len(rows)
+        self.unchanged += len(self.rows) - len(rows)
+        if self.metrics and self.changes_only:
+            self.metrics.count('unchanged', len(self.rows) - len(rows))
+        self.rows = []
+        if self.on_commit is not None:
+            self.on_commit(self.keys)
+        self.keys = []
+
+    def _changed(self, products: list) -> list:
+        """records state and changes for the products whose fingerprint moved,
+        inside the open transaction, and returns them
+        """
+        stored = {}
+        for chunk, marks in _chunks(list({product.product_id for product in products})):
+            stored.update(self.conn.execute(
+                f'SELECT product_id, hash FROM product_state WHERE product_id IN ({marks});', chunk
+            ))
+        now = time.time()
+        changed = []
+        for product in products:
+            digest = fingerprint(product)
+            if stored.get(product.product_id) == digest:
+                continue
+            stored[product.product_id] = digest
+            changed.append(product)
+        self.conn.executemany(UPSERT_STATE, [(p.product_id, stored[p.product_id], now, now) for p in changed])
+        self.conn.executemany(INSERT_CHANGE, [
+            (p.product_id, now, p.currency, p.price, p.availability, p.price_valid_until, p.description)
+            for p in changed
+        ])
+        self.tracked = True
+        return changed
+
+    def _forget(self, products: list) -> None:
+        """drops the state of products about to be overwritten without tracking"""
+        for chunk, marks in _chunks(list({product.product_id for product in products})):
+            self.conn.execute(f'DELETE FROM product_state WHERE product_id IN ({marks});', chunk)
+
+    def close(self) -> None:
+        self.flush()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
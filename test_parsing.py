@@ -0,0 +1,36 @@
+"""Golden checks for parsing.py
+the scan backend must agree with BeautifulSoup on every saved page in corpus/
+
+usage: python -m pytest test_parsing.py
+"""
+
+import pathlib
+
+from bench_parse import compare_backends
+from parsing import parse_product_links, parse_product_page
+
+CORPUS = pathlib.Path(__file__).parent / 'corpus'
+
+def read(kind: str, name: str) -> bytes:
+    return (CORPUS / kind / f'{name}.html').read_bytes()
+
+def test_backends_match_soup():
+    assert compare_backends(CORPUS)
+
+def test_links_survive_quoted_angle_brackets():
+    urls = dict(parse_product_links(read('category', 'womens-dresses')))
+    assert urls == {
+        '9801234': 'https://www.macys.com/shop/product/calvin-klein-sheath-dress?ID=9801234',
+        '9805678': 'https://www.macys.com/shop/product/lauren-ralph-lauren-jersey-dress?ID=9805678',
+        '9809012': 'https://www.macys.com/shop/product/alfani-wrap-dress?ID=9809012',
+        '9803456': 'https://www.macys.com/shop/product/inc-midi-dress?ID=9803456',
+    }
+
+def test_product_script_needs_an_exact_id():
+    product = parse_product_page(read('product', 'calvin-klein-sheath-dress'))
+    assert (product.product_id, product.brand, product.price) == (9801234, 'Calvin Klein', 134.0)
+
+def test_comments_and_scripts_are_not_markup():
+    urls = dict(parse_product_links(read('category', 'handbags-with-templates')))
+    assert sorted(urls) == ['6001001', '6001002']
+    assert parse_product_page(read('product', 'commented-out-data')).product_id == 6001001